@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api.metrics import install_query_counter
+
+        # Count the queries of each request on whatever thread's connection runs them
+        connection_created.connect(install_query_counter)
@@ -0,0 +1,285 @@
+"""
+Endpoint benchmarks for the routes in api/urls.py.
+
+`seed_dataset` fills an (empty, throwaway) database with users, daily work sessions and
+leaves; `run_benchmarks` times each route through the Django test client and counts its
+SQL queries. Mutating requests run inside a rolled-back transaction, so every iteration
+sees the same data. The results are plain dicts so they can be written to JSON and
+compared between runs with `compare_results`.
+"""
+import json
+import random
+from datetime import datetime, time, timedelta
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+from django.utils.regex_helper import normalize
+from django.utils.timezone import localtime, make_aware, now
+from rest_framework_simplejwt.tokens import RefreshToken
+from userauths.models import User
+
+from api import urls as api_urls
+from worklog import telegram_users
+from worklog.calendar import to_jalali
+from worklog.models import Leave, WorkLog
+
+BENCHMARK_PASSWORD = 'Benchmark-pass-1'
+
+# Logging out would end the benchmark client's session for the routes after it
+SKIPPED_ROUTES = {'user/logout/'}
+
+FRIDAY = 4
+
+
+def seed_dataset(users=500, years=3, seed=0, stdout=None):
+    """
+    Create `users` users with `years` years of history up to yesterday: one work session
+    on most working days (sometimes two), a few full-day leaves and some hourly leaves.
+    The first user is a superuser with BENCHMARK_PASSWORD; it is the one the routes use.
+    """
+    rng = random.Random(seed)
+    last_day = localtime(now()).date() - timedelta(days=1)
+    first_day = last_day - timedelta(days=365 * years)
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    password = make_password(BENCHMARK_PASSWORD)
+
+    User.objects.bulk_create([
+        User(
+            username=f'bench{index:05d}',
+            email=f'bench{index:05d}@example.com',
+            telegram_id=str(100000 + index),
+            password=password,
+            is_staff=index == 0,
+            is_superuser=index == 0,
+        )
+        for index in range(users)
+    ], batch_size=1000)
+
+    for count, user_id in enumerate(User.objects.order_by('pk').values_list('pk', flat=True), 1):
+        work_logs, leaves = [], []
+        for day in days:
+            if day.weekday() == FRIDAY:
+                continue
+            roll = rng.random()
+            if roll < 0.02:
+                leaves.append(Leave(user_id=user_id, leave_date=day, reason='benchmark'))
+                continue
+            if roll < 0.05:
+                leaves.append(Leave(
+                    user_id=user_id, leave_date=day,
+                    start_time=time(14), end_time=time(14 + rng.randint(1, 3)),
+                ))
+
+            start = make_aware(datetime.combine(day, time(8))) + timedelta(minutes=rng.randint(0, 90))
+            sessions = [(start, start + timedelta(minutes=rng.randint(420, 540)))]
+            if rng.random() < 0.1:
+                # A lunch break splits the day into two sessions
+                break_start = start + timedelta(hours=4)
+                sessions = [(start, break_start), (break_start + timedelta(minutes=45), sessions[0][1])]
+            for session_start, session_end in sessions:
+                work_logs.append(WorkLog(user_id=user_id, status='started', recorded_time=session_start, comment=''))
+                work_logs.append(WorkLog(user_id=user_id, status='ended', recorded_time=session_end, comment=''))
+
+        # bulk_create skips save(), so fill the Jalali/Gregorian fields here
+        for record in work_logs + leaves:
+            record.set_date_fields()
+        WorkLog.objects.bulk_create(work_logs, batch_size=2000)
+        Leave.objects.bulk_create(leaves, batch_size=2000)
+
+        if stdout and count % 50 == 0:
+            stdout.write(f"Seeded {count}/{users} users")
+
+    # bulk_create sends no signals, so build the derived rows in one pass
+    call_command('rebuild_work_sessions', stdout=stdout)
+    call_command('rebuild_rollups', stdout=stdout)
+
+
+def iter_routes(patterns=None, prefix='', regex_prefix=''):
+    """Yield (route, callback, path_format, params) for every URL pattern, following includes."""
+    for pattern in api_urls.urlpatterns if patterns is None else patterns:
+        route = prefix + str(pattern.pattern)
+        regex = regex_prefix + pattern.pattern.regex.pattern.lstrip('^')
+        if isinstance(pattern, URLResolver):
+            yield from iter_routes(pattern.url_patterns, route, regex)
+        elif isinstance(pattern, URLPattern):
+            path_format, params = normalize(regex)[0]
+            yield route, pattern.callback, path_format, params
+
+
+def route_methods(callback):
+    """The GET/POST methods the view serves; other methods are not benchmarked."""
+    actions = getattr(callback, 'actions', None)
+    if actions is not None:
+        methods = set(actions)
+    else:
+        view_class = getattr(callback, 'view_class', None) or getattr(callback, 'cls', None)
+        methods = {method for method in ('get', 'post') if hasattr(view_class, method)}
+    return [method for method in ('get', 'post') if method in methods]
+
+
+class Samples:
+    """Path parameters and request bodies that exist in the seeded dataset."""
+
+    def __init__(self):
+        self.user = User.objects.order_by('pk').first()
+        today = localtime(now()).date()
+        sample_day = today - timedelta(days=60)
+        jalali_day = to_jalali(sample_day)
+        recent_day = today - timedelta(days=7) if (today - timedelta(days=7)).year == today.year else today
+
+        self.params = {
+            'user_pk': self.user.pk,
+            'user_id': self.user.pk,
+            'telegram_id': self.user.telegram_id,
+            'year': sample_day.year,
+            'month': sample_day.month,
+            'day': recent_day.day,
+            'jalali_year': jalali_day.year,
+            'jalali_month': jalali_day.month,
+            'kind': 'worklogs',
+        }
+        # Routes whose parameter means something else than in the rest of the file
+        self.route_params = {
+            'worklog/day/<int:user_id>/<str:month>/<int:day>/': {'month': recent_day.strftime('%B')},
+            'worklog/record/<int:pk>/': {
+                'pk': WorkLog.objects.filter(user=self.user).values_list('pk', flat=True).last()
+            },
+            'leave/record/<int:pk>/': {
+                'pk': Leave.objects.filter(user=self.user).values_list('pk', flat=True).last()
+            },
+        }
+
+        recorded_time = now().isoformat()
+        leave_date = (today + timedelta(days=30)).isoformat()
+        jalali_leave_day = to_jalali(today + timedelta(days=30))
+        signup = {
+            'username': 'bench-signup', 'email': 'bench-signup@example.com', 'telegram_id': '999999999',
+            'password': BENCHMARK_PASSWORD, 'password2': BENCHMARK_PASSWORD,
+        }
+        # A semester of weekly afternoon leaves
+        leave_batch = {
+            'start_date': leave_date, 'end_date': (today + timedelta(days=150)).isoformat(),
+            'weekdays': ['thursday'], 'start_time': '13:00', 'end_time': '17:00',
+        }
+        self.bodies = {
+            'user/token/': {'username': self.user.username, 'password': BENCHMARK_PASSWORD},
+            'user/token/refresh/': {'refresh': str(RefreshToken.for_user(self.user))},
+            'user-signup/': signup,
+            'telegram/user-signup/': signup,
+            'worklog/add/<int:user_pk>/': {'status': 'started', 'recorded_time': recorded_time},
+            'worklog/bulk/': [
+                {'telegram_id': self.user.telegram_id, 'status': 'started', 'recorded_time': recorded_time},
+            ],
+            # start_time/end_time are in Leave's unique_together, which makes DRF require them
+            'leave/add-daily/<int:user_pk>/': {
+                'user': self.user.pk, 'leave_date': leave_date, 'start_time': None, 'end_time': None,
+            },
+            'leave/add-hourly/<int:user_pk>/': {
+                'user': self.user.pk, 'leave_date': leave_date, 'start_time': '10:00', 'end_time': '11:00',
+            },
+            'leave/jalali/add-daily/<int:user_pk>': {
+                'user': self.user.pk,
+                'jalali_leave_date': f'{jalali_leave_day.year}-{jalali_leave_day.month:02d}-{jalali_leave_day.day:02d}',
+            },
+            r'^telegram/worklog/add/(?P<telegram_id>\d+)/$': {'status': 'started', 'recorded_time': recorded_time},
+            r'^telegram/leave/add/(?P<telegram_id>\d+)/$': {'leave_date': leave_date},
+            'leave/batch/': leave_batch,
+            r'^telegram/leave/batch/(?P<telegram_id>\d+)/$': leave_batch,
+        }
+
+    def path(self, route, path_format, params):
+        values = {**self.params, **self.route_params.get(route, {})}
+        return '/' + path_format % {param: values[param] for param in params}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def time_request(client, method, path, body, iterations, warmup, cold_cache):
+    timings, queries, status_code = [], [], None
+    for iteration in range(warmup + iterations):
+        if cold_cache:
+            cache.clear()
+            telegram_users.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = perf_counter()
+                if method == 'get':
+                    response = client.get(path)
+                else:
+                    response = client.post(path, data=json.dumps(body), content_type='application/json')
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+                elapsed = perf_counter() - started
+            # Undo whatever the request wrote so every iteration sees the same data
+            transaction.set_rollback(True)
+        status_code = response.status_code
+        if iteration >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(captured.captured_queries))
+
+    return {
+        'status': status_code,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': max(queries),
+    }
+
+
+def run_benchmarks(iterations=20, warmup=2, cold_cache=True, only=None, stdout=None):
+    """Time every route of api/urls.py; returns {"METHOD route": result}."""
+    samples = Samples()
+    client = Client()
+    client.force_login(samples.user)
+
+    results = {}
+    for route, callback, path_format, params in iter_routes():
+        if route in SKIPPED_ROUTES or (only and only not in route):
+            continue
+        path = samples.path(route, path_format, params)
+        for method in route_methods(callback):
+            if method == 'post' and route not in samples.bodies:
+                continue
+            key = f'{method.upper()} {route}'
+            results[key] = {
+                'path': path,
+                **time_request(client, method, path, samples.bodies.get(route), iterations, warmup, cold_cache),
+            }
+            if stdout:
+                result = results[key]
+                stdout.write(
+                    f"{key:<100} {result['status']:>3}  p50 {result['p50_ms']:8.2f} ms  "
+                    f"p95 {result['p95_ms']:8.2f} ms  {result['queries']:4d} queries"
+                )
+    return results
+
+
+def compare_results(baseline, current, tolerance=0.25, min_delta_ms=1.0):
+    """
+    Return the regressions of `current` against `baseline` as human-readable lines:
+    more queries than before, or a p95 more than `tolerance` (and `min_delta_ms`) slower.
+    """
+    regressions = []
+    for key, result in current['routes'].items():
+        previous = baseline['routes'].get(key)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            regressions.append(f"{key}: {previous['queries']} -> {result['queries']} queries")
+        slower = result['p95_ms'] - previous['p95_ms']
+        if slower > min_delta_ms and result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {previous['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+    return regressions
+
+
+def benchmark_metadata(**options):
+    return {'created': now().isoformat(), 'database': connection.vendor, **options}
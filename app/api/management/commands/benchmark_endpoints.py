@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from api.benchmarks import benchmark_metadata, compare_results, run_benchmarks, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and record p50/p95 latency and SQL query counts "
+        "for every route in api/urls.py, optionally comparing against a previous run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--years', type=int, default=3, help="Years of daily history per user.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed of the dataset.")
+        parser.add_argument('--iterations', type=int, default=20, help="Timed calls per route.")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed calls per route.")
+        parser.add_argument('--warm-cache', action='store_true',
+                            help="Keep the summary caches between calls instead of clearing them.")
+        parser.add_argument('--only', help="Only benchmark routes containing this text.")
+        parser.add_argument('--output', default='benchmark.json', help="JSON file to write the results to.")
+        parser.add_argument('--compare', help="Results of a previous run; fail on regressions against it.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed relative p95 slowdown before a route counts as a regression.")
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help="Ignore p95 slowdowns smaller than this, whatever the ratio.")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1.")
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stdout.write(f"Seeding {options['users']} users x {options['years']} years...")
+            seed_dataset(options['users'], options['years'], options['seed'], stdout=self.stdout)
+            routes = run_benchmarks(
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                cold_cache=not options['warm_cache'],
+                only=options['only'],
+                stdout=self.stdout,
+            )
+            results = {
+                'meta': benchmark_metadata(
+                    users=options['users'], years=options['years'], seed=options['seed'],
+                    iterations=options['iterations'], warm_cache=options['warm_cache'],
+                ),
+                'routes': routes,
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(routes)} results to {options['output']}."))
+
+        failed = [key for key, result in routes.items() if result['status'] >= 500]
+        for key in failed:
+            self.stderr.write(f"{key} answered {routes[key]['status']}")
+
+        if baseline is not None:
+            regressions = compare_results(baseline, results, options['tolerance'], options['min_delta_ms'])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}.")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}."))
+
+        if failed:
+            raise CommandError(f"{len(failed)} route(s) failed.")
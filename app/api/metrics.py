@@ -0,0 +1,209 @@
+"""
+Per-view request metrics in Prometheus text format.
+
+MetricsMiddleware records, for each resolved URL name, the request count by method and
+status, a latency histogram, and the number and total time of the SQL queries the request
+ran. Time not spent in SQL is serialization and Python work such as the session pairing
+loops. Streaming responses (the CSV exports) are timed up to the first byte: their rows
+are read after the middleware returns.
+
+Queries are counted by an execute wrapper that ApiConfig.ready installs on every database
+connection as it opens, and added to the QueryTimer held in a context variable. Under ASGI
+the ORM runs in sync_to_async threads with their own connections; they inherit a copy of
+the request's context, so their queries still reach its timer, and concurrent requests
+never share one.
+
+The registry lives in process memory: each worker process exposes its own counters,
+which is how the Prometheus client libraries behave without a multiprocess directory.
+"""
+import contextvars
+import threading
+from collections import defaultdict
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from worklog.cache import summary_cache_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_VIEW = 'unmatched'
+
+
+class ViewMetrics:
+
+    def __init__(self):
+        self.requests = defaultdict(int)  # (method, status) -> count
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(ViewMetrics)
+
+    def observe(self, view, method, status, seconds, queries, query_seconds):
+        with self._lock:
+            metrics = self._views[view]
+            metrics.requests[(method, status)] += 1
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    metrics.buckets[index] += 1
+                    break
+            metrics.latency_sum += seconds
+            metrics.count += 1
+            metrics.queries += queries
+            metrics.query_seconds += query_seconds
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = [
+                '# HELP worklog_http_requests_total Requests by view, method and status.',
+                '# TYPE worklog_http_requests_total counter',
+            ]
+            for view, metrics in views:
+                for (method, status), count in sorted(metrics.requests.items()):
+                    lines.append(
+                        f'worklog_http_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}'
+                    )
+
+            lines += [
+                '# HELP worklog_http_request_duration_seconds Request latency by view.',
+                '# TYPE worklog_http_request_duration_seconds histogram',
+            ]
+            for view, metrics in views:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                    cumulative += count
+                    lines.append(f'worklog_http_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'worklog_http_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {metrics.count}')
+                lines.append(f'worklog_http_request_duration_seconds_sum{{view="{view}"}} {metrics.latency_sum:.6f}')
+                lines.append(f'worklog_http_request_duration_seconds_count{{view="{view}"}} {metrics.count}')
+
+            lines += [
+                '# HELP worklog_db_queries_total SQL queries run by requests, by view.',
+                '# TYPE worklog_db_queries_total counter',
+            ]
+            lines += [f'worklog_db_queries_total{{view="{view}"}} {metrics.queries}' for view, metrics in views]
+
+            lines += [
+                '# HELP worklog_db_query_duration_seconds_total Time spent in SQL by requests, by view.',
+                '# TYPE worklog_db_query_duration_seconds_total counter',
+            ]
+            lines += [
+                f'worklog_db_query_duration_seconds_total{{view="{view}"}} {metrics.query_seconds:.6f}'
+                for view, metrics in views
+            ]
+
+        for name, value in sorted(summary_cache_stats().items()):
+            lines += [
+                f'# HELP worklog_summary_cache_{name}_total Monthly summary cache {name}.',
+                f'# TYPE worklog_summary_cache_{name}_total counter',
+                f'worklog_summary_cache_{name}_total {value}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class QueryTimer:
+    """Counts the queries of one request and times them."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += perf_counter() - started
+            self.queries += 1
+
+
+# The QueryTimer of the request being handled, if any
+current_timer = contextvars.ContextVar('metrics_query_timer', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver: put count_query on every new connection, once."""
+    if count_query not in connection.execute_wrappers:
+        # First, so the pop of an enclosing connection.execute_wrapper() block never removes it
+        connection.execute_wrappers.insert(0, count_query)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED_VIEW
+    label = match.url_name or match.route
+    # Prometheus label values escape backslashes, quotes and newlines
+    return label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.observe(request, response, perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        timer = QueryTimer()
+        # The view's sync_to_async threads run in a copy of this context, so they see the timer
+        token = current_timer.set(timer)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.observe(request, response, perf_counter() - started, timer)
+        return response
+
+    def observe(self, request, response, seconds, timer):
+        registry.observe(
+            view_label(request), request.method, response.status_code,
+            seconds, timer.queries, timer.seconds
+        )
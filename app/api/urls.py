@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.urls import include, path, re_path
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from api import views as api_views
 from userauths import views as userauth_views
 from worklog import worklog_views
 from worklog import telegram_views
 from worklog import leave_views
+from worklog import report_views
+from worklog import telegram_async_views
 
 
 urlpatterns = [
@@ -34,6 +38,11 @@ urlpatterns = [
               })
          , name='worklog-detail'
          ),
+    path(
+         'worklog/bulk/',
+         worklog_views.WorkLogBulkCreateView.as_view(),
+         name='worklog-bulk-create'
+         ),
     path(
          'worklog/day/<int:user_id>/<str:month>/<int:day>/',
          worklog_views.WorkLogDayView.as_view(),
@@ -42,7 +51,7 @@ urlpatterns = [
     path(
          'worklog/monthly/<int:year>/<int:month>/',
          worklog_views.MonthlyWorkLogView.as_view(),
-         name='monthly-worklog'
+         name='gregorian-monthly-worklog'
          ),
     path(
          'worklog/jalali/monthly/<int:jalali_year>/<int:jalali_month>/',
@@ -54,7 +63,7 @@ urlpatterns = [
     path(
          'leave/add-daily/<int:user_pk>/',
          leave_views.LeaveCreateView.as_view({'get': 'list', 'post': 'create'}),
-         name='add-leave'
+         name='add-daily-leave'
          ),
     path('leave/record/<int:pk>/',
          leave_views.LeaveCreateView.as_view({
@@ -88,27 +97,80 @@ urlpatterns = [
          'leave/jalali/add-daily/<int:user_pk>',
          leave_views.JalaliLeaveCreateAPIView.as_view({'post': 'create'}),
          name='add_jalali_leave_day'),
+    path(
+         'leave/batch/',
+         leave_views.LeaveBatchCreateView.as_view(),
+         name='leave-batch-create'
+         ),
+
+    # Reports
+    path(
+         'export/<str:kind>/',
+         report_views.ExportView.as_view(),
+         name='export'
+         ),
+    path(
+         'report/monthly/<int:jalali_year>/<int:jalali_month>/',
+         report_views.MonthlyTimesheetView.as_view(),
+         name='monthly-timesheet'
+         ),
+    path(
+         'report/yearly/<int:jalali_year>/',
+         report_views.YearlyTimesheetView.as_view(),
+         name='yearly-timesheet'
+         ),
+    path(
+         'report/heatmap/<int:jalali_year>/',
+         report_views.YearlyHeatmapView.as_view(),
+         name='yearly-heatmap'
+         ),
+    path(
+         'presence/',
+         report_views.PresenceView.as_view(),
+         name='presence'
+         ),
+
+    # Monitoring
+    path('metrics', api_views.metrics_view, name='metrics'),
+   ]
+
+# Telegram
+# TELEGRAM_ASYNC_VIEWS serves the bot's endpoints from the async-ORM views under ASGI
+if settings.TELEGRAM_ASYNC_VIEWS:
+     telegram_worklog_create = telegram_async_views.AsyncTelegramWorkLogView.as_view()
+     telegram_leave_create = telegram_async_views.AsyncTelegramLeaveView.as_view()
+     telegram_monthly_worklog = telegram_async_views.AsyncTelegramJalaliMonthlyWorkLogView.as_view()
+     telegram_monthly_leave = telegram_async_views.AsyncTelegramJalaliMonthlyLeaveView.as_view()
+else:
+     telegram_worklog_create = telegram_views.TelegramWorkLogView.as_view({'post': 'create'})
+     telegram_leave_create = telegram_views.TelegramLeaveView.as_view({'post': 'create'})
+     telegram_monthly_worklog = telegram_views.TelegramJalaliMonthlyWorkLogView.as_view({'get': 'list'})
+     telegram_monthly_leave = telegram_views.TelegramJalaliMonthlyLeaveView.as_view({'get': 'list'})
 
-   # Telegram
+urlpatterns += [
    re_path(
         r'^telegram/worklog/add/(?P<telegram_id>\d+)/$',
-        telegram_views.TelegramWorkLogView.as_view({'post': 'create'}),
+        telegram_worklog_create,
         name='worklog-telegram-create'
         ),
    re_path(
         r'^telegram/leave/add/(?P<telegram_id>\d+)/$',
-        telegram_views.TelegramLeaveView.as_view({'post': 'create'}),
+        telegram_leave_create,
         name='leave-telegram-create'
         ),
+   re_path(
+        r'^telegram/leave/batch/(?P<telegram_id>\d+)/$',
+        telegram_views.TelegramLeaveBatchView.as_view(),
+        name='leave-telegram-batch'
+        ),
      re_path(
      r'^telegram/worklog/jalali/monthly/(?P<telegram_id>\d+)/(?P<jalali_year>\d{4})/(?P<jalali_month>\d{1,2})/$',
-     telegram_views.TelegramJalaliMonthlyWorkLogView.as_view({'get': 'list'}),
+     telegram_monthly_worklog,
      name='jalali-monthly-worklog'
      ),
      re_path(
      r'^telegram/leave/jalali/monthly/(?P<telegram_id>\d+)/(?P<jalali_year>\d{4})/(?P<jalali_month>\d{1,2})/$',
-     telegram_views.TelegramJalaliMonthlyLeaveView.as_view({'get': 'list'}),
+     telegram_monthly_leave,
      name='jalali-monthly-leave'
      ),
-   
-   ]
\ No newline at end of file
+   ]
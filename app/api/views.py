@@ -1,3 +1,13 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
 
-# Create your views here.
+from .metrics import registry
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; requires `Authorization: Bearer <METRICS_TOKEN>` when that is set."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -32,6 +33,8 @@ INSTALLED_APPS = [
     'drf_spectacular',
 ]
 MIDDLEWARE = [
+    # First, so its latency covers the other middleware too
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -132,6 +135,79 @@ DATABASES = {
     }
 }
 
+# DB_PROFILE=production tunes every SQLite connection for concurrent readers and writers:
+# WAL so reads don't wait for writes, NORMAL sync (safe with WAL), a busy timeout instead
+# of immediate "database is locked" errors, IMMEDIATE write transactions, and a larger
+# page cache plus memory-mapped I/O.
+if os.getenv('DB_PROFILE') == 'production':
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': int(os.getenv('DB_BUSY_TIMEOUT', 20)),
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            f"PRAGMA mmap_size={int(os.getenv('DB_MMAP_SIZE', 256 * 1024 * 1024))};"
+            f"PRAGMA cache_size=-{int(os.getenv('DB_CACHE_SIZE_KB', 64 * 1024))};"
+            'PRAGMA temp_store=MEMORY;'
+        ),
+    }
+
+# Cache
+# Local memory by default. Writes only evict the entries of the process that made them, so
+# with several worker processes use CACHE_BACKEND=file (processes of one node) or
+# CACHE_BACKEND=redis (needs the redis package; give it a database of its own, as the
+# rebuild commands clear the whole cache).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            # Outside the source tree by default; every worker process must see the same directory
+            'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'worklog-tracker-cache')),
+        }
+    }
+elif CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'worklog-tracker',
+        }
+    }
+
+# Lifetime (seconds) of the monthly summaries and yearly heatmaps in worklog/cache.py.
+# Writes evict them early, but a per-process cache never hears about the writes of other
+# workers or of management commands, so it only keeps them for a minute.
+SUMMARY_CACHE_TIMEOUT = int(os.getenv(
+    'SUMMARY_CACHE_TIMEOUT', 7 * 24 * 3600 if CACHE_BACKEND in ('file', 'redis') else 60
+))
+
+
+# Serve the Telegram endpoints from the async views in worklog/telegram_async_views.py.
+# Only worth it under an ASGI server (see "ASGI run mode" in the README).
+TELEGRAM_ASYNC_VIEWS = os.getenv('TELEGRAM_ASYNC_VIEWS', 'false').lower() in ('1', 'true', 'yes')
+
+# Process-wide telegram_id -> user pk cache of worklog/telegram_users.py (0 disables it).
+# Other processes are not notified of User changes, so entries expire after the TTL (seconds).
+TELEGRAM_USER_CACHE_SIZE = int(os.getenv('TELEGRAM_USER_CACHE_SIZE', 4096))
+TELEGRAM_USER_CACHE_TTL = int(os.getenv('TELEGRAM_USER_CACHE_TTL', 300))
+
+
+# Longest long-poll (seconds) /presence/?wait= may hold a request open
+PRESENCE_MAX_WAIT = float(os.getenv('PRESENCE_MAX_WAIT', 30))
+
+# Per-view request/SQL metrics served on /metrics (api/metrics.py)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -181,3 +257,6 @@ LOGIN_REDIRECT_URL = 'add-work-log'
 LOGOUT_REDIRECT_URL = 'login' 
 
 AUTH_USER_MODEL = 'userauths.User'
+
+# Span (inclusive, Solar Hijri years) of the precomputed calendar in worklog/calendar.py
+JALALI_CALENDAR_YEARS = (1350, 1500)
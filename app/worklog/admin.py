@@ -1,8 +1,16 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.utils.timezone import localdate
+from persiantools.jdatetime import MONTH_NAMES_EN
+from worklog.calendar import GREGORIAN_MONTH_NAMES, GREGORIAN_WEEKDAY_NAMES, to_jalali
 from worklog.models import WorkLog, Leave
 from userauths.models import User
 
+# Years offered by the Jalali year filter, counting back from the current one
+ADMIN_JALALI_YEARS = 6
+
 class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'telegram_id', 'is_staff', 'is_active')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups')
@@ -24,17 +32,122 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+class CappedCountPaginator(Paginator):
+    """
+    Counts at most `limit` rows (a bounded subquery) instead of running COUNT(*) over the
+    whole filtered table; past the cap the changelist shows `limit` results.
+    """
+    limit = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list.values('pk')[:self.limit].count()
+
+
+class UsernameFilter(admin.SimpleListFilter):
+    """A username text box, instead of a link for every user in the database."""
+    title = 'user'
+    parameter_name = 'username'
+    template = 'admin/worklog/username_filter.html'
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(user__username=self.value())
+        return queryset
+
+    def choices(self, changelist):
+        yield {
+            'value': self.value() or '',
+            'clear_query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            # Keep the other filters, the search and the ordering when the box is submitted
+            'hidden_params': [
+                (name, value) for name, value in changelist.params.items() if name != self.parameter_name
+            ],
+        }
+
+
+class NamesFilter(admin.SimpleListFilter):
+    """Fixed choices for a name column, so no SELECT DISTINCT runs over the table."""
+    names = ()
+
+    def lookups(self, request, model_admin):
+        return [(name, name) for name in self.names if name]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+class WeekdayFilter(NamesFilter):
+    title = 'day of week'
+    parameter_name = 'day_of_week'
+    names = GREGORIAN_WEEKDAY_NAMES
+
+
+class MonthFilter(NamesFilter):
+    title = 'month'
+    parameter_name = 'month'
+    names = GREGORIAN_MONTH_NAMES
+
+
+class JalaliYearFilter(admin.SimpleListFilter):
+    title = 'Jalali year'
+    parameter_name = 'jalali_year'
+
+    def lookups(self, request, model_admin):
+        current = to_jalali(localdate()).year
+        return [(str(year), str(year)) for year in range(current, current - ADMIN_JALALI_YEARS, -1)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(jalali_year=self.value())
+        return queryset
+
+
+class JalaliMonthFilter(admin.SimpleListFilter):
+    """Offered once a Jalali year is picked, so the (jalali_year, jalali_month_number) index applies."""
+    title = 'Jalali month'
+    parameter_name = 'jalali_month_number'
+
+    def lookups(self, request, model_admin):
+        if not request.GET.get(JalaliYearFilter.parameter_name):
+            return ()
+        return [(str(number), name) for number, name in enumerate(MONTH_NAMES_EN) if name]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(jalali_month_number=self.value())
+        return queryset
+
+
 class WorkLogAdmin(admin.ModelAdmin):
     list_display = ('user', 'recorded_time', 'status', 'day_of_week', 'month', 'comment')
-    list_filter = ('status', 'day_of_week', 'month', 'user')
+    list_filter = ('status', UsernameFilter, JalaliYearFilter, JalaliMonthFilter, WeekdayFilter, MonthFilter)
+    list_select_related = ('user',)
     search_fields = ('user__username', 'status', 'comment')
     ordering = ('-recorded_time',)
+    date_hierarchy = 'recorded_time'
+    autocomplete_fields = ('user',)
+    paginator = CappedCountPaginator
+    show_full_result_count = False
     
 class LeaveAdmin(admin.ModelAdmin):
     list_display = ('user', 'leave_date', 'reason')
-    list_filter = ('user', 'leave_date', 'reason')
+    list_filter = (UsernameFilter, JalaliYearFilter, JalaliMonthFilter)
+    list_select_related = ('user',)
     search_fields = ('user__username', 'leave_date', 'reason')
     ordering = ('-leave_date',)
+    date_hierarchy = 'leave_date'
+    autocomplete_fields = ('user',)
+    paginator = CappedCountPaginator
+    show_full_result_count = False
 
 admin.site.register(User, UserAdmin)
 admin.site.register(WorkLog, WorkLogAdmin)
@@ -0,0 +1,137 @@
+"""
+Cache of the monthly work/leave summaries served to the bot.
+
+Entries are keyed by (kind, user, calendar, year, month) and evicted by the WorkLog and
+Leave signal receivers for exactly the user-months a write touches, so they can live
+for a long time: past months practically never change.
+
+Yearly heatmaps are cached under a per-Jalali-year version number instead, bumped whenever
+the daily rollups of that year are rewritten, so any write to a year retires all of its
+heatmaps (per user or per group) at once.
+
+Commands that rewrite rows in bulk, without signals, call clear_report_caches() when done.
+"""
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .calendar import to_jalali
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def summary_key(kind, user_id, calendar, year, month):
+    return f'summary:{kind}:{user_id}:{calendar}:{int(year)}:{int(month)}'
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get_or_set_summary(kind, user_id, calendar, year, month, compute):
+    """Return the cached summary, or compute, store and return it."""
+    key = summary_key(kind, user_id, calendar, year, month)
+    summary = cache.get(key)
+    if summary is not None:
+        _count('hits')
+        return summary
+
+    _count('misses')
+    summary = compute()
+    cache.set(key, summary, getattr(settings, 'SUMMARY_CACHE_TIMEOUT', None))
+    return summary
+
+
+async def aget_or_set_summary(kind, user_id, calendar, year, month, compute):
+    """Async version of get_or_set_summary; `compute` is a coroutine function."""
+    key = summary_key(kind, user_id, calendar, year, month)
+    summary = await cache.aget(key)
+    if summary is not None:
+        _count('hits')
+        return summary
+
+    _count('misses')
+    summary = await compute()
+    await cache.aset(key, summary, getattr(settings, 'SUMMARY_CACHE_TIMEOUT', None))
+    return summary
+
+
+def evict_summaries(kind, user_id, *moments):
+    """Drop the Gregorian and Jalali month summaries containing each of the given dates/datetimes."""
+    keys = set()
+    for moment in moments:
+        if moment is None:
+            continue
+        jalali_date = to_jalali(moment)
+        keys.add(summary_key(kind, user_id, 'jalali', jalali_date.year, jalali_date.month))
+        keys.add(summary_key(kind, user_id, 'gregorian', moment.year, moment.month))
+    if keys:
+        cache.delete_many(list(keys))
+        _count('evictions', len(keys))
+
+
+def evict_summaries_on_commit(kind, user_id, *moments):
+    # Evicting before commit would let a concurrent read cache the old rows again
+    transaction.on_commit(partial(evict_summaries, kind, user_id, *moments))
+
+
+def heatmap_version_key(jalali_year):
+    return f'heatmap:version:{int(jalali_year)}'
+
+
+def heatmap_version(jalali_year):
+    key = heatmap_version_key(jalali_year)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_heatmap_versions(*jalali_years):
+    for jalali_year in set(jalali_years):
+        try:
+            cache.incr(heatmap_version_key(jalali_year))
+        except ValueError:
+            # Missing (never read, or evicted): any new value retires the old entries
+            cache.set(heatmap_version_key(jalali_year), time.time_ns(), None)
+
+
+def evict_heatmaps_on_commit(first_day, last_day):
+    """Retire the heatmaps of every Jalali year from first_day through last_day once the transaction commits."""
+    years = range(to_jalali(first_day).year, to_jalali(last_day).year + 1)
+    transaction.on_commit(partial(bump_heatmap_versions, *years))
+
+
+def get_or_set_heatmap(jalali_year, scope, compute):
+    """Return the cached heatmap of `scope` (a string naming the users) for the year's current version."""
+    key = f'heatmap:{int(jalali_year)}:{heatmap_version(jalali_year)}:{scope}'
+    heatmap = cache.get(key)
+    if heatmap is not None:
+        _count('hits')
+        return heatmap
+
+    _count('misses')
+    heatmap = compute()
+    cache.set(key, heatmap, getattr(settings, 'SUMMARY_CACHE_TIMEOUT', None))
+    return heatmap
+
+
+def clear_report_caches():
+    """
+    Drop every cached summary and heatmap, after a bulk rewrite that sent no signals.
+    This clears the whole default cache: with the per-process locmem backend only the
+    calling process is affected, and the servers' entries expire after SUMMARY_CACHE_TIMEOUT.
+    """
+    cache.clear()
+
+
+def summary_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,143 @@
+"""
+Precomputed Gregorian <-> Jalali lookup table.
+
+Every day in the configured span is stored once in flat arrays indexed by
+``date.toordinal() - first_ordinal``, so converting a date, building the display
+strings that WorkLog/Leave store, or finding a month's boundaries is an index
+lookup instead of a persiantools calculation. Dates outside the span fall back
+to persiantools.
+"""
+from array import array
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from persiantools.jdatetime import MONTH_NAMES_EN, WEEKDAY_NAMES_EN, JalaliDate
+
+DEFAULT_YEAR_SPAN = (1350, 1500)
+
+GREGORIAN_WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday',
+                           'Friday', 'Saturday', 'Sunday')
+GREGORIAN_MONTH_NAMES = (None, 'January', 'February', 'March', 'April', 'May', 'June', 'July',
+                         'August', 'September', 'October', 'November', 'December')
+
+JalaliDay = namedtuple('JalaliDay', ['year', 'month', 'day', 'weekday', 'weekday_name', 'month_name'])
+
+
+class JalaliCalendar:
+    def __init__(self, first_year, last_year):
+        self.first_year = first_year
+        self.last_year = last_year
+        # Year starts come from persiantools' own conversion so the table agrees with
+        # the values already stored by JalaliDate, including the years where its leap
+        # rule and its conversion disagree on the length of Esfand.
+        year_starts = [
+            JalaliDate(year, 1, 1).to_gregorian().toordinal()
+            for year in range(first_year, last_year + 2)
+        ]
+        self.first_ordinal = year_starts[0]
+
+        self._years = array('H')
+        self._months = array('B')
+        self._days = array('B')
+        # Ordinal of the first day of every month, plus one past the last month
+        self._month_starts = array('l')
+
+        ordinal = self.first_ordinal
+        for year in range(first_year, last_year + 1):
+            for month in range(1, 13):
+                self._month_starts.append(ordinal)
+                if month <= 6:
+                    length = 31
+                elif month <= 11:
+                    length = 30
+                else:
+                    length = year_starts[year - first_year + 1] - ordinal
+                self._years.extend([year] * length)
+                self._months.extend([month] * length)
+                self._days.extend(range(1, length + 1))
+                ordinal += length
+        self._month_starts.append(ordinal)
+        self.last_ordinal = ordinal - 1
+
+    def __contains__(self, value):
+        return self.first_ordinal <= _as_date(value).toordinal() <= self.last_ordinal
+
+    def to_jalali(self, value):
+        """Return the JalaliDay of a Gregorian date or datetime."""
+        value = _as_date(value)
+        ordinal = value.toordinal()
+        index = ordinal - self.first_ordinal
+        if not 0 <= index < len(self._years):
+            jalali_date = JalaliDate(value)
+            year, month, day = jalali_date.year, jalali_date.month, jalali_date.day
+        else:
+            year, month, day = self._years[index], self._months[index], self._days[index]
+
+        # Jalali weeks start on Saturday (0); date.weekday() starts on Monday
+        weekday = (ordinal + 1) % 7
+        return JalaliDay(year, month, day, weekday, WEEKDAY_NAMES_EN[weekday], MONTH_NAMES_EN[month])
+
+    def to_gregorian(self, year, month, day):
+        """Return the Gregorian date of a Jalali date; raises ValueError when it does not exist."""
+        if not self.first_year <= year <= self.last_year:
+            return JalaliDate(year, month, day).to_gregorian()
+        if not 1 <= month <= 12:
+            raise ValueError("month must be in 1..12")
+
+        position = (year - self.first_year) * 12 + month - 1
+        month_start = self._month_starts[position]
+        if not 1 <= day <= self._month_starts[position + 1] - month_start:
+            raise ValueError("day is out of range for month")
+        return date.fromordinal(month_start + day - 1)
+
+    def month_range(self, year, month):
+        """Return (first day, first day of the next month) of a Jalali month as Gregorian dates."""
+        start = self.to_gregorian(year, month, 1)
+        if month == 12:
+            return start, self.to_gregorian(year + 1, 1, 1)
+        return start, self.to_gregorian(year, month + 1, 1)
+
+    def year_range(self, year):
+        """Return (first day, first day of the next year) of a Jalali year as Gregorian dates."""
+        return self.to_gregorian(year, 1, 1), self.to_gregorian(year + 1, 1, 1)
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+_calendar = None
+
+
+def get_calendar():
+    global _calendar
+    if _calendar is None:
+        first_year, last_year = getattr(settings, 'JALALI_CALENDAR_YEARS', DEFAULT_YEAR_SPAN)
+        _calendar = JalaliCalendar(first_year, last_year)
+    return _calendar
+
+
+def to_jalali(value):
+    return get_calendar().to_jalali(value)
+
+
+def to_gregorian(year, month, day):
+    return get_calendar().to_gregorian(year, month, day)
+
+
+def month_range(year, month):
+    return get_calendar().month_range(year, month)
+
+
+def month_datetime_range(year, month):
+    """Return the first and last instant of a Jalali month, for recorded_time__range filters."""
+    start, end = month_range(year, month)
+    return (datetime.combine(start, datetime.min.time()),
+            datetime.combine(end, datetime.min.time()) - timedelta(microseconds=1))
+
+
+def year_range(year):
+    return get_calendar().year_range(year)
@@ -0,0 +1,211 @@
+import csv
+import re
+import zipfile
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+from django.utils.timezone import make_aware
+
+from .calendar import to_gregorian
+from .models import Leave, WorkLog, WorkSession
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORTS = {
+    'worklogs': {
+        'model': WorkLog,
+        'date_field': 'recorded_time',
+        'ordering': ('recorded_time', 'id'),
+        'columns': ('id', 'user_id', 'user__username', 'status', 'recorded_time',
+                    'jalali_date', 'jalali_day_of_week', 'comment'),
+    },
+    'sessions': {
+        'model': WorkSession,
+        'date_field': 'start',
+        'ordering': ('start', 'id'),
+        'columns': ('id', 'user_id', 'user__username', 'start', 'end', 'duration_seconds',
+                    'jalali_year', 'jalali_month_number', 'jalali_day'),
+    },
+    'leaves': {
+        'model': Leave,
+        'date_field': 'leave_date',
+        'ordering': ('leave_date', 'id'),
+        'columns': ('id', 'user_id', 'user__username', 'leave_date', 'jalali_leave_date',
+                    'start_time', 'end_time', 'reason'),
+    },
+}
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# The fixed parts of a one-sheet workbook; the sheet itself is written row by row
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet"/>'
+        '<Relationship Id="rId2" Target="styles.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/styles"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+# Characters XML 1.0 cannot carry, even escaped
+XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+class Echo:
+    """File-like object whose write() returns the value, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def parse_period(start=None, end=None, jalali_start=None, jalali_end=None):
+    """
+    Return the (first, last) Gregorian dates of an export period, both inclusive.
+    Dates are 'YYYY-MM-DD'; Jalali bounds take precedence over Gregorian ones.
+    """
+    def parse_jalali(value):
+        year, month, day = map(int, value.split('-'))
+        return to_gregorian(year, month, day)
+
+    def parse_gregorian(value):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+
+    first = parse_jalali(jalali_start) if jalali_start else parse_gregorian(start) if start else None
+    last = parse_jalali(jalali_end) if jalali_end else parse_gregorian(end) if end else None
+    return first, last
+
+
+def export_queryset(kind, first=None, last=None, user_id=None):
+    export = EXPORTS[kind]
+    queryset = export['model'].objects.order_by(*export['ordering'])
+    date_field = export['date_field']
+
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    if export['model'] is Leave:
+        if first:
+            queryset = queryset.filter(leave_date__gte=first)
+        if last:
+            queryset = queryset.filter(leave_date__lte=last)
+    else:
+        # Half-open datetime range so the date columns' indexes can be used
+        if first:
+            queryset = queryset.filter(**{f'{date_field}__gte': make_aware(datetime.combine(first, datetime.min.time()))})
+        if last:
+            queryset = queryset.filter(**{f'{date_field}__lt': make_aware(datetime.combine(last + timedelta(days=1), datetime.min.time()))})
+
+    return queryset.values_list(*export['columns'])
+
+
+def iter_csv_rows(kind, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield CSV lines for the export one row at a time, starting with the header."""
+    writer = csv.writer(Echo())
+    yield writer.writerow([column.replace('__', '_') for column in EXPORTS[kind]['columns']])
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield writer.writerow(row)
+
+
+class ZipStream:
+    """Unseekable file for ZipFile that keeps what was written until take() hands it out."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def xlsx_row(values):
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, int) and not isinstance(value, bool):
+            cells.append(f'<c t="n"><v>{value}</v></c>')
+        else:
+            # Dates and times as the same text the CSV export writes
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(XML_ILLEGAL.sub("", str(value)))}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def iter_xlsx_rows(kind, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the bytes of a one-sheet XLSX workbook of the export, header row first.
+    The zip is written to an unseekable stream, so sizes go in data descriptors and only
+    the compressed output of the current chunk of rows is held at a time.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content.format(sheet=kind))
+        yield stream.take()
+
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + xlsx_row(column.replace('__', '_') for column in EXPORTS[kind]['columns'])
+            ).encode())
+            for count, row in enumerate(queryset.iterator(chunk_size=chunk_size), start=1):
+                sheet.write(xlsx_row(row).encode())
+                if count % chunk_size == 0:
+                    yield stream.take()
+            sheet.write(b'</sheetData></worksheet>')
+    yield stream.take()
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', iter_csv_rows),
+    'xlsx': (XLSX_CONTENT_TYPE, iter_xlsx_rows),
+}
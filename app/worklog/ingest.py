@@ -0,0 +1,156 @@
+import json
+from bisect import bisect_right
+from collections import defaultdict
+from operator import itemgetter
+
+from django.db import transaction
+from django.utils.timezone import localtime
+from rest_framework import serializers
+from userauths.models import User
+
+from .cache import evict_summaries_on_commit
+from .models import WorkLog, WorkLogState
+from .rollups import refresh_worklog_rollups
+from .sessions import latest_worklog, refresh_work_sessions, refresh_worklog_state
+from .validators import check_worklog_sequence, previous_worklog
+
+
+class BulkWorkLogEventSerializer(serializers.Serializer):
+    telegram_id = serializers.CharField(max_length=50)
+    status = serializers.ChoiceField(choices=WorkLog.STATUS_CHOICES)
+    recorded_time = serializers.DateTimeField()
+    comment = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+def parse_events(body):
+    """
+    Parse a JSON array or a JSON-lines body into a list of events.
+    Lines that are not valid JSON are returned as (index, error) pairs.
+    """
+    body = body.strip()
+    if body.startswith('['):
+        try:
+            events = json.loads(body)
+        except ValueError as exc:
+            raise serializers.ValidationError(f"Invalid JSON body: {exc}") from exc
+        return events, []
+
+    events = []
+    errors = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            events.append(json.loads(line))
+        except ValueError as exc:
+            errors.append((len(events), f"Invalid JSON line: {exc}"))
+            events.append(None)
+    return events, errors
+
+
+def ingest_worklogs(events, batch_size=500):
+    """
+    Validate and insert clock events for many users at once.
+
+    Each user's events are sorted and checked with the same rules as validate_worklog
+    (check_worklog_sequence): events from the latest log on against the user's
+    WorkLogState, back-dated ones against the log before them in the user's history,
+    which is read once from the earliest of them on. The state rows are locked for the whole
+    check and insert, so a concurrent clock event cannot slip in between.
+    Returns (created_count, errors) where errors is a list of {'index', 'error'} dicts.
+    """
+    errors = []
+    valid_events = defaultdict(list)
+
+    for index, event in enumerate(events):
+        if event is None:
+            continue
+        serializer = BulkWorkLogEventSerializer(data=event)
+        if not serializer.is_valid():
+            errors.append({'index': index, 'error': serializer.errors})
+            continue
+        data = serializer.validated_data
+        data['recorded_time'] = localtime(data['recorded_time'])
+        valid_events[data['telegram_id']].append((index, data))
+
+    user_ids = dict(
+        User.objects.filter(telegram_id__in=valid_events).values_list('telegram_id', 'pk')
+    )
+    for telegram_id in set(valid_events) - set(user_ids):
+        for index, _ in valid_events.pop(telegram_id):
+            errors.append({'index': index, 'error': "User with this telegram_id does not exist."})
+
+    new_logs = []
+    with transaction.atomic():
+        for user_id in set(user_ids.values()) - set(
+            WorkLogState.objects.filter(pk__in=user_ids.values()).values_list('pk', flat=True)
+        ):
+            refresh_worklog_state(user_id, latest_worklog(user_id))
+        states = WorkLogState.objects.select_for_update().in_bulk(user_ids.values())
+
+        user_logs = {}
+        for telegram_id, user_events in valid_events.items():
+            user_id = user_ids[telegram_id]
+            user_events.sort(key=lambda item: item[1]['recorded_time'])
+            timeline = worklog_timeline(user_id, states[user_id], user_events[0][1]['recorded_time'])
+
+            accepted = []
+            for index, data in user_events:
+                status, recorded_time = data['status'], data['recorded_time']
+                # After any existing or earlier accepted log at the same time
+                position = bisect_right(timeline, recorded_time, key=itemgetter(1))
+                previous = timeline[position - 1] if position else (None, None)
+                try:
+                    check_worklog_sequence(status, recorded_time, *previous)
+                except serializers.ValidationError as exc:
+                    errors.append({'index': index, 'error': str(exc.detail[0])})
+                    continue
+
+                timeline.insert(position, (status, recorded_time))
+                work_log = WorkLog(
+                    user_id=user_id,
+                    status=status,
+                    recorded_time=recorded_time,
+                    comment=data.get('comment')
+                )
+                # bulk_create skips save(), so fill the Jalali/Gregorian fields here
+                work_log.set_date_fields()
+                accepted.append(work_log)
+            if accepted:
+                user_logs[user_id] = accepted
+                new_logs.extend(accepted)
+
+        WorkLog.objects.bulk_create(new_logs, batch_size=batch_size)
+        # bulk_create sends no signals, so refresh the derived rows once per user
+        for user_id, logs in user_logs.items():
+            state = states[user_id]
+            times = [log.recorded_time for log in logs]
+            # Accepted logs are in time order; the last one is the latest unless all were back-dated
+            latest = logs[-1]
+            if state.last_recorded_time is not None and latest.recorded_time < state.last_recorded_time:
+                latest = latest_worklog(user_id)
+            anchor = refresh_work_sessions(user_id, times[0])
+            refresh_worklog_state(user_id, latest)
+            refresh_worklog_rollups(user_id, anchor, latest.recorded_time)
+            evict_summaries_on_commit('worklog', user_id, anchor, *times)
+
+    errors.sort(key=lambda error: error['index'])
+    return len(new_logs), errors
+
+
+def worklog_timeline(user_id, state, earliest):
+    """
+    The user's logs that can come right before an event at `earliest` or later, as
+    time-ordered (status, recorded_time) pairs: just the latest log from the state row,
+    or for a back-dated batch the one before `earliest` and every log after it.
+    """
+    if state.last_recorded_time is None:
+        return []
+    if earliest >= state.last_recorded_time:
+        return [(state.last_status, state.last_recorded_time)]
+
+    previous = previous_worklog(user_id, earliest)
+    later = WorkLog.objects.filter(user_id=user_id, recorded_time__gt=earliest).order_by(
+        'recorded_time', 'id'
+    ).values_list('status', 'recorded_time')
+    return ([previous] if previous[0] else []) + list(later)
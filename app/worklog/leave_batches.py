@@ -0,0 +1,126 @@
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.db import transaction
+from rest_framework import serializers
+from userauths.models import User
+
+from .cache import evict_summaries_on_commit
+from .calendar import GREGORIAN_WEEKDAY_NAMES
+from .leaves import MAX_LEAVE_DAYS, MAX_LEAVE_SPAN, fill_leave_interval, leave_interval, overlapping_leaves
+from .models import Leave
+from .rollups import refresh_daily_rollups
+from .validators import check_leave_overlap, leave_request_interval
+
+WEEKDAY_NUMBERS = {name.lower(): number for number, name in enumerate(GREGORIAN_WEEKDAY_NAMES)}
+
+
+class LeaveBatchSerializer(serializers.Serializer):
+    """
+    A date range, optionally narrowed to a weekly recurrence: e.g. every Thursday
+    afternoon of a semester is {"start_date", "end_date", "weekdays": ["thursday"],
+    "start_time": "13:00", "end_time": "17:00"}. Without times every date is a full day.
+    """
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    weekdays = serializers.ListField(
+        child=serializers.ChoiceField(choices=list(WEEKDAY_NUMBERS)), required=False, allow_empty=False
+    )
+    every_weeks = serializers.IntegerField(min_value=1, default=1)
+    start_time = serializers.TimeField(required=False, allow_null=True)
+    end_time = serializers.TimeField(required=False, allow_null=True)
+    reason = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    skip_conflicts = serializers.BooleanField(
+        default=False, help_text="Create the free dates even if others conflict, instead of none."
+    )
+
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("end_date cannot be before start_date.")
+        if (data['end_date'] - data['start_date']).days >= MAX_LEAVE_DAYS:
+            raise serializers.ValidationError(f"A batch cannot span more than {MAX_LEAVE_DAYS} days.")
+        leave_request_interval(data['start_date'], data.get('start_time'), data.get('end_time'), None)
+
+        data['dates'] = expand_leave_dates(
+            data['start_date'], data['end_date'], data.get('weekdays'), data['every_weeks']
+        )
+        if not data['dates']:
+            raise serializers.ValidationError("The recurrence matches no date in the range.")
+        return data
+
+
+def expand_leave_dates(start_date, end_date, weekdays=None, every_weeks=1):
+    """
+    Dates from start_date through end_date, limited to `weekdays` (names) and to every
+    `every_weeks`-th week counted from start_date.
+    """
+    numbers = {WEEKDAY_NUMBERS[name] for name in weekdays} if weekdays else None
+    dates = []
+    for offset in range((end_date - start_date).days + 1):
+        day = start_date + timedelta(days=offset)
+        if numbers is not None and day.weekday() not in numbers:
+            continue
+        if (offset // 7) % every_weeks:
+            continue
+        dates.append(day)
+    return dates
+
+
+def create_leave_batch(user_id, dates, start_time=None, end_time=None, reason=None, skip_conflicts=False):
+    """
+    Check the leaves of `dates` (sorted) against the user's existing leaves and insert
+    them in one transaction.
+
+    The existing leaves of the whole range are read with one indexed query; as none spans
+    more than MAX_LEAVE_SPAN, each new interval is then matched by bisecting their start
+    times. Conflicting dates are reported with the validate_leave_overlap message. Unless
+    `skip_conflicts` is set, any conflict means nothing is created.
+
+    The check and the insert share the transaction, and the user's row is locked first,
+    so two concurrent batches of one user cannot both pass the check. SQLite has no row
+    locks; there the IMMEDIATE transactions of DB_PROFILE=production queue the second
+    batch, and the default deferred ones make it fail instead of double-booking.
+    Returns (created_count, results) with one {'leave_date', 'created', 'error'} per date.
+    """
+    intervals = [leave_interval(day, start_time, end_time) for day in dates]
+    with transaction.atomic():
+        User.objects.select_for_update().filter(pk=user_id).values_list('pk', flat=True).first()
+        existing = sorted(
+            map(fill_leave_interval, overlapping_leaves(
+                Leave.objects.filter(user_id=user_id), intervals[0][0], intervals[-1][1]
+            )),
+            key=lambda leave: leave.starts_at
+        )
+        existing_starts = [leave.starts_at for leave in existing]
+
+        new_leaves = []
+        results = []
+        for day, (starts_at, ends_at) in zip(dates, intervals):
+            candidates = existing[
+                bisect_right(existing_starts, starts_at - MAX_LEAVE_SPAN):bisect_left(existing_starts, ends_at)
+            ]
+            conflict = next((leave for leave in candidates if leave.ends_at > starts_at), None)
+            if conflict is not None:
+                try:
+                    check_leave_overlap(conflict, start_time, end_time)
+                except serializers.ValidationError as exc:
+                    results.append({'leave_date': day, 'created': False, 'error': str(exc.detail[0])})
+                continue
+
+            leave = Leave(user_id=user_id, leave_date=day, start_time=start_time, end_time=end_time, reason=reason)
+            # bulk_create skips save(), so fill the Jalali fields and the interval here
+            leave.set_date_fields()
+            new_leaves.append(leave)
+            results.append({'leave_date': day, 'created': True, 'error': None})
+
+        if len(new_leaves) < len(dates) and not skip_conflicts:
+            for result in results:
+                result['created'] = False
+            return 0, results
+
+        Leave.objects.bulk_create(new_leaves)
+        # bulk_create sends no signals, so refresh the rollups and evict the cached summaries here
+        if new_leaves:
+            refresh_daily_rollups([user_id], new_leaves[0].leave_date, new_leaves[-1].leave_date)
+        evict_summaries_on_commit('leave', user_id, *(leave.leave_date for leave in new_leaves))
+    return len(new_leaves), results
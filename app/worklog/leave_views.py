@@ -27,6 +27,9 @@ from .serializers import (HourlyLeaveSerializer, JalaliLeaveSerializer,
                           LeaveSerializer, WorkLogDaySerializer,
                           WorkLogSerializer, TelegramWorkLogSerializer,
                           TelegramLeaveSerializer, TelegramJalaliLeaveSerializer)
+from .leave_batches import LeaveBatchSerializer, create_leave_batch
+from .leaves import leave_totals
+from .pagination import LeaveCursorPagination
 
 
 
@@ -34,6 +37,7 @@ from .serializers import (HourlyLeaveSerializer, JalaliLeaveSerializer,
 class LeaveCreateView(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = LeaveSerializer
+    pagination_class = LeaveCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -71,6 +75,35 @@ class LeaveCreateView(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         instance.delete()
     
+class LeaveBatchCreateView(APIView):
+    """
+    Book the leaves of a date range or weekly recurrence in one request (see
+    LeaveBatchSerializer). Returns one result per generated date.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_user_id(self):
+        return self.request.user.pk
+
+    def post(self, request, *args, **kwargs):
+        serializer = LeaveBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        created, results = create_leave_batch(
+            self.get_user_id(), data['dates'],
+            start_time=data.get('start_time'),
+            end_time=data.get('end_time'),
+            reason=data.get('reason'),
+            skip_conflicts=data['skip_conflicts'],
+        )
+        return Response({
+            'requested': len(results),
+            'created': created,
+            'results': results
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
 class UserLeaveCountAPIView(APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = LeaveSerializer
@@ -87,6 +120,7 @@ class HourlyLeaveViewSet(viewsets.ModelViewSet):
     queryset = Leave.objects.all()
     serializer_class = HourlyLeaveSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LeaveCursorPagination
 
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user)
@@ -137,19 +171,10 @@ class YearlyJalaliLeaveView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, jalali_year):
-        leaves = Leave.objects.all()
-        total_days = 0
-        total_hours = timedelta()
-
-        for leave in leaves:
-            leave_jalali_date = JalaliDate.to_jalali(leave.leave_date)
-            
-            if leave_jalali_date.year == int(jalali_year):
-                total_days += 1
-                if leave.start_time and leave.end_time:
-                    start_datetime = datetime.combine(leave.leave_date, leave.start_time)
-                    end_datetime = datetime.combine(leave.leave_date, leave.end_time)
-                    total_hours += (end_datetime - start_datetime)
+        full_days, hourly, total_hours = leave_totals(
+            Leave.objects.filter(jalali_year=jalali_year)
+        )
+        total_days = full_days + hourly
 
         total_hours_in_hours = total_hours.total_seconds() / 3600
 
@@ -165,20 +190,11 @@ class MonthlyJalaliLeaveView(APIView):
     
     def get(self, request, jalali_year, jalali_month):
         user = request.user
-        leaves = Leave.objects.filter(user=user)
-        total_days = 0
-        total_hours = timedelta()
-        
-        for leave in leaves:
-            leave_jalali_date = JalaliDate.to_jalali(leave.leave_date)
-            
-            if leave_jalali_date.year == int(jalali_year) and leave_jalali_date.month == int(jalali_month):
-                if leave.start_time and leave.end_time:
-                    start_datetime = datetime.combine(leave.leave_date, leave.start_time)
-                    end_datetime = datetime.combine(leave.leave_date, leave.end_time)
-                    total_hours += (end_datetime - start_datetime)
-                else:
-                    total_days += 1
+        total_days, _, total_hours = leave_totals(Leave.objects.filter(
+            user=user,
+            jalali_year=jalali_year,
+            jalali_month_number=jalali_month
+        ))
 
         total_hours_in_hours = total_hours.total_seconds() // 3600
         total_minutes_in_minutes = (total_hours.total_seconds() % 3600) // 60
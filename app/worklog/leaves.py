@@ -0,0 +1,81 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.utils.timezone import localtime, make_aware
+
+HOURLY_LEAVE = Q(start_time__isnull=False, end_time__isnull=False)
+
+# A Leave row covers at most one day (multi-day leaves are stored per day), plus an hour
+# of slack for DST, which lets overlap queries bound their index range from below too
+MAX_LEAVE_SPAN = timedelta(days=1, hours=1)
+# Longest leave a single request may book
+MAX_LEAVE_DAYS = 366
+
+
+def leave_interval(leave_date, start_time=None, end_time=None, last_date=None):
+    """
+    Half-open [starts_at, ends_at) span of a leave. Hourly leaves cover their times on
+    leave_date; anything else covers whole days from leave_date through last_date.
+    """
+    if start_time is not None and end_time is not None:
+        return (make_aware(datetime.combine(leave_date, start_time)),
+                make_aware(datetime.combine(leave_date, end_time)))
+    return (make_aware(datetime.combine(leave_date, time.min)),
+            make_aware(datetime.combine((last_date or leave_date) + timedelta(days=1), time.min)))
+
+
+def overlapping_leaves(queryset, starts_at, ends_at):
+    """
+    Rows of a Leave queryset whose interval intersects [starts_at, ends_at), oldest first.
+    Rows saved before the interval columns existed (starts_at is NULL until
+    recompute_date_fields backfills them) are matched on leave_date and their times.
+    """
+    return queryset.filter(
+        Q(starts_at__gt=starts_at - MAX_LEAVE_SPAN, starts_at__lt=ends_at, ends_at__gt=starts_at)
+        | Q(starts_at__isnull=True) & _unfilled_overlap(starts_at, ends_at)
+    ).order_by('starts_at', 'leave_date', 'start_time')
+
+
+def _unfilled_overlap(starts_at, ends_at):
+    """The overlap test of overlapping_leaves for rows without starts_at/ends_at."""
+    start, end = localtime(starts_at), localtime(ends_at)
+    first_day, last_day = start.date(), (end - timedelta(microseconds=1)).date()
+    # Hourly leaves on the first and last day must also overlap the hours
+    hourly = Q(leave_date__gt=first_day) | Q(end_time__gt=start.time())
+    if end.date() == last_day:
+        hourly &= Q(leave_date__lt=last_day) | Q(start_time__lt=end.time())
+    return Q(leave_date__range=(first_day, last_day)) & (~HOURLY_LEAVE | hourly)
+
+
+def fill_leave_interval(leave):
+    """Set starts_at/ends_at in memory on a row that predates them; return the row."""
+    if leave.starts_at is None:
+        leave.starts_at, leave.ends_at = leave_interval(leave.leave_date, leave.start_time, leave.end_time)
+    return leave
+
+
+def leave_totals(queryset):
+    """
+    Return (full_day_count, hourly_count, hourly_duration) for a Leave queryset in one query.
+    """
+    return _unpack_totals(queryset.aggregate(**totals_aggregates()))
+
+
+async def aleave_totals(queryset):
+    """Async version of leave_totals."""
+    return _unpack_totals(await queryset.aaggregate(**totals_aggregates()))
+
+
+def totals_aggregates():
+    return dict(
+        full_days=Count('id', filter=~HOURLY_LEAVE),
+        hourly=Count('id', filter=HOURLY_LEAVE),
+        hourly_duration=Sum(
+            ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField()),
+            filter=HOURLY_LEAVE
+        ),
+    )
+
+
+def _unpack_totals(totals):
+    return totals['full_days'], totals['hourly'], totals['hourly_duration'] or timedelta()
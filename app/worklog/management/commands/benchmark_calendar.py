@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+from persiantools.jdatetime import JalaliDate
+
+from worklog.calendar import get_calendar
+
+
+class Command(BaseCommand):
+    help = "Compare the precomputed Jalali calendar table against per-call persiantools conversions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=10000, help="Number of consecutive days to convert.")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        calendar = get_calendar()
+        first_day = date(2020, 3, 20)
+        days = [first_day + timedelta(days=offset) for offset in range(options['days'])]
+        jalali_days = [calendar.to_jalali(day) for day in days]
+
+        def library_to_jalali():
+            for day in days:
+                jalali_date = JalaliDate(day)
+                jalali_date.strftime('%Y-%m-%d')
+                jalali_date.strftime('%A')
+                jalali_date.strftime('%B')
+
+        def table_to_jalali():
+            for day in days:
+                jalali_date = calendar.to_jalali(day)
+                f'{jalali_date.year:04d}-{jalali_date.month:02d}-{jalali_date.day:02d}'
+
+        def library_to_gregorian():
+            for jalali_date in jalali_days:
+                JalaliDate(jalali_date.year, jalali_date.month, jalali_date.day).to_gregorian()
+
+        def table_to_gregorian():
+            for jalali_date in jalali_days:
+                calendar.to_gregorian(jalali_date.year, jalali_date.month, jalali_date.day)
+
+        for name, library, table in (
+            ('to_jalali + names', library_to_jalali, table_to_jalali),
+            ('to_gregorian', library_to_gregorian, table_to_gregorian),
+        ):
+            library_time = timeit(library, number=options['repeat'])
+            table_time = timeit(table, number=options['repeat'])
+            calls = options['days'] * options['repeat']
+            self.stdout.write(
+                f"{name:<18} persiantools {library_time / calls * 1e6:7.2f} us/call   "
+                f"table {table_time / calls * 1e6:7.2f} us/call   "
+                f"speedup x{library_time / table_time:.1f}"
+            )
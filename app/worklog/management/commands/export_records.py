@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from worklog.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, EXPORTS, export_queryset, parse_period
+
+
+class Command(BaseCommand):
+    help = "Stream worklogs, work sessions or leaves of a period to CSV or an XLSX workbook."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--start', help="First Gregorian date, YYYY-MM-DD.")
+        parser.add_argument('--end', help="Last Gregorian date, YYYY-MM-DD.")
+        parser.add_argument('--jalali-start', help="First Jalali date, YYYY-MM-DD.")
+        parser.add_argument('--jalali-end', help="Last Jalali date, YYYY-MM-DD.")
+        parser.add_argument('--user', type=int, help="Only export this user id.")
+        parser.add_argument('--output', help="File to write; defaults to stdout.")
+        parser.add_argument('--file-format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            first, last = parse_period(
+                options['start'], options['end'], options['jalali_start'], options['jalali_end']
+            )
+        except ValueError as exc:
+            raise CommandError("Invalid date. Use 'YYYY-MM-DD'.") from exc
+
+        queryset = export_queryset(options['kind'], first, last, options['user'])
+        _, iter_rows = EXPORT_FORMATS[options['file_format']]
+        rows = iter_rows(options['kind'], queryset, chunk_size=options['chunk_size'])
+
+        if options['file_format'] == 'xlsx':
+            # A zip: bytes, and no newline translation
+            if options['output']:
+                with open(options['output'], 'wb') as output:
+                    output.writelines(rows)
+            else:
+                sys.stdout.buffer.writelines(rows)
+        elif options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(rows)
+        else:
+            sys.stdout.writelines(rows)
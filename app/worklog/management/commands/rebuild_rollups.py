@@ -0,0 +1,108 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Min
+from django.utils.timezone import localdate
+from userauths.models import User
+
+from worklog.cache import clear_report_caches
+from worklog.calendar import year_range
+from worklog.models import Leave, WorkSession
+from worklog.rollups import local_date, refresh_daily_rollups
+
+
+def rebuild_chunk(user_ids, first_day, last_day):
+    return refresh_daily_rollups(user_ids, first_day, last_day)
+
+
+def date_chunks(first_day, last_day, days):
+    while first_day <= last_day:
+        chunk_end = min(first_day + timedelta(days=days - 1), last_day)
+        yield first_day, chunk_end
+        first_day = chunk_end + timedelta(days=1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the DailyRollup rows of a date range from WorkSession and Leave, in chunks "
+        "of days and users, optionally in several worker processes (one user shard each)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help="First day (YYYY-MM-DD); default: the oldest data.")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last day (YYYY-MM-DD); default: today.")
+        parser.add_argument('--jalali-year', type=int, help="Rebuild one Jalali year instead of --start/--end.")
+        parser.add_argument('--user', type=int, action='append', help="Only these user ids (repeatable).")
+        parser.add_argument('--workers', type=int, default=1, help="Worker processes; users are sharded across them.")
+        parser.add_argument('--chunk-days', type=int, default=31, help="Days recomputed per transaction.")
+        parser.add_argument('--batch-users', type=int, default=200, help="Users recomputed per transaction.")
+
+    def handle(self, *args, **options):
+        if options['chunk_days'] < 1 or options['batch_users'] < 1 or options['workers'] < 1:
+            raise CommandError("--chunk-days, --batch-users and --workers must be at least 1.")
+        self.verbosity = options['verbosity']
+
+        first_day, last_day = self.get_range(options)
+        if first_day is None or first_day > last_day:
+            self.stdout.write("Nothing to rebuild.")
+            return
+
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(pk__in=options['user'])
+        user_ids = list(users.values_list('pk', flat=True))
+
+        # Shard k holds every workers-th user, so each process works on its own users
+        workers = options['workers']
+        tasks = [
+            (shard[index:index + options['batch_users']], chunk_first, chunk_last)
+            for shard in (user_ids[number::workers] for number in range(workers))
+            for index in range(0, len(shard), options['batch_users'])
+            for chunk_first, chunk_last in date_chunks(first_day, last_day, options['chunk_days'])
+        ]
+        self.stdout.write(
+            f"Rebuilding {first_day} to {last_day} for {len(user_ids)} users in {len(tasks)} chunks..."
+        )
+
+        rows = 0
+        if workers == 1:
+            for done, task in enumerate(tasks, start=1):
+                rows += rebuild_chunk(*task)
+                self.report_progress(done, len(tasks), rows)
+        else:
+            # Forked workers must not share the parent's SQLite connection
+            connections.close_all()
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                futures = [pool.submit(rebuild_chunk, *task) for task in tasks]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    rows += future.result()
+                    self.report_progress(done, len(tasks), rows)
+
+        # The workers' heatmap evictions only reached their own process cache
+        clear_report_caches()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} daily rollups."))
+
+    def get_range(self, options):
+        if options['jalali_year']:
+            try:
+                first_day, next_year = year_range(options['jalali_year'])
+            except ValueError as exc:
+                raise CommandError(f"Invalid Jalali year {options['jalali_year']}: {exc}") from exc
+            return first_day, next_year - timedelta(days=1)
+
+        first_day = options['start']
+        if first_day is None:
+            oldest = [
+                WorkSession.objects.aggregate(first=Min('start'))['first'],
+                Leave.objects.aggregate(first=Min('leave_date'))['first'],
+            ]
+            oldest = [local_date(moment) for moment in oldest if moment is not None]
+            first_day = min(oldest) if oldest else None
+        return first_day, options['end'] or localdate()
+
+    def report_progress(self, done, total, rows):
+        if self.verbosity >= 2 or done == total or done % max(total // 10, 1) == 0:
+            self.stdout.write(f"  {done}/{total} chunks, {rows} rows")
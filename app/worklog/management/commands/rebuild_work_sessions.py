@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from userauths.models import User
+
+from worklog.cache import clear_report_caches
+from worklog.models import WorkLog, WorkSession
+from worklog.sessions import build_work_session, latest_worklog, pair_work_sessions, refresh_worklog_state
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the WorkSession and WorkLogState tables from the raw WorkLog events. "
+        "Run rebuild_rollups afterwards to refresh the daily rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only rebuild sessions of this user id.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(pk=options['user'])
+
+        total = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            logs = WorkLog.objects.filter(user_id=user_id).order_by(
+                'recorded_time', 'id'
+            ).only('status', 'recorded_time')
+            sessions = [
+                build_work_session(user_id, start, end)
+                for start, end in pair_work_sessions(logs.iterator())
+            ]
+            with transaction.atomic():
+                WorkSession.objects.filter(user_id=user_id).delete()
+                WorkSession.objects.bulk_create(sessions, batch_size=1000)
+                refresh_worklog_state(user_id, latest_worklog(user_id))
+            total += len(sessions)
+
+        # bulk_create sent no signals, so cached summaries may still show the old sessions
+        clear_report_caches()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} work sessions."))
@@ -0,0 +1,146 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from worklog.cache import clear_report_caches
+from worklog.models import Leave, WorkLog
+
+DATE_FIELDS = {
+    WorkLog: ['jalali_date', 'jalali_day_of_week', 'jalali_month', 'jalali_year',
+              'jalali_month_number', 'jalali_day', 'day_of_week', 'month'],
+    Leave: ['jalali_leave_date', 'jalali_day_of_week', 'jalali_month', 'jalali_year',
+            'jalali_month_number', 'jalali_day', 'starts_at', 'ends_at'],
+}
+# The fields set_date_fields() reads
+SOURCE_FIELDS = {
+    WorkLog: ['recorded_time'],
+    Leave: ['leave_date', 'start_time', 'end_time'],
+}
+MODELS = {model._meta.model_name: model for model in DATE_FIELDS}
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized Jalali/Gregorian date fields (and leave intervals) of WorkLog "
+        "and Leave rows, walking primary-key ranges and writing back only the rows that changed. "
+        "Work sessions and daily rollups are then rebuilt from the corrected rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--model', choices=sorted(MODELS), action='append',
+                            help="Only recompute this model (repeatable); default: all.")
+        parser.add_argument('--start-pk', type=int, default=0,
+                            help="Skip rows with a primary key up to this one.")
+        parser.add_argument('--state-file',
+                            help="JSON file recording the last primary key done per model. "
+                                 "Updated after every batch and read on start, so an interrupted run resumes; "
+                                 "a model's entry is removed when its pass finishes.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Write nothing; print the fields that would change.")
+        parser.add_argument('--show', type=int, default=20,
+                            help="Rows printed in dry-run mode (default 20).")
+        parser.add_argument('--skip-derived', action='store_true',
+                            help="Do not run rebuild_work_sessions and rebuild_rollups afterwards.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        self.options = options
+        self.state_path = Path(options['state_file']) if options['state_file'] else None
+        self.state = json.loads(self.state_path.read_text()) if self.state_path and self.state_path.exists() else {}
+
+        names = options['model'] or list(MODELS)
+        for name in names:
+            self.recompute(MODELS[name])
+        if options['dry_run']:
+            return
+
+        # bulk_update sent no signals. Rollups are keyed on local days, which move with
+        # TIME_ZONE even when no stored field does, so rebuild whether or not rows changed.
+        if not options['skip_derived']:
+            if 'worklog' in names:
+                call_command('rebuild_work_sessions', stdout=self.stdout)
+            call_command('rebuild_rollups', stdout=self.stdout, verbosity=options['verbosity'])
+        clear_report_caches()
+
+    def recompute(self, model):
+        name = model._meta.model_name
+        fields = DATE_FIELDS[model]
+        batch_size, dry_run = self.options['batch_size'], self.options['dry_run']
+        last_pk = max(self.options['start_pk'], self.state.get(name, 0))
+        max_pk = model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+        if last_pk:
+            self.stdout.write(f"{model.__name__}: resuming after pk {last_pk}.")
+
+        queryset = model.objects.order_by('pk').only(*SOURCE_FIELDS[model], *fields)
+        scanned = changed = 0
+        counts = dict.fromkeys(fields, 0)
+        started = time.monotonic()
+        while True:
+            # Keyset pagination: every batch is one range scan of the primary key
+            rows = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not rows:
+                break
+
+            stale = []
+            for obj in rows:
+                before = [getattr(obj, field) for field in fields]
+                obj.set_date_fields()
+                diff = [
+                    (field, old, getattr(obj, field))
+                    for field, old in zip(fields, before) if old != getattr(obj, field)
+                ]
+                if diff:
+                    stale.append(obj)
+                    for field, old, new in diff:
+                        counts[field] += 1
+                    if dry_run and changed + len(stale) <= self.options['show']:
+                        self.stdout.write(f"  {model.__name__} {obj.pk}: " + ", ".join(
+                            f"{field} {old!r} -> {new!r}" for field, old, new in diff
+                        ))
+
+            if stale and not dry_run:
+                with transaction.atomic():
+                    model.objects.bulk_update(stale, fields)
+            scanned += len(rows)
+            changed += len(stale)
+            last_pk = rows[-1].pk
+            if not dry_run:
+                self.save_state(name, last_pk)
+            self.report_progress(model, scanned, changed, last_pk, max_pk, started)
+
+        if not dry_run:
+            # Done: a later run with the same file starts this model from the beginning
+            self.save_state(name, None)
+
+        verb = "Would update" if dry_run else "Updated"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {changed} of {scanned} {model.__name__} rows."))
+        if dry_run and changed:
+            self.stdout.write("  " + ", ".join(f"{field}: {count}" for field, count in counts.items() if count))
+
+    def save_state(self, name, last_pk):
+        """Record `last_pk` as the resume point of model `name`, or drop it when None."""
+        if self.state_path is None:
+            return
+        if last_pk is None:
+            self.state.pop(name, None)
+        else:
+            self.state[name] = last_pk
+        # Write then rename, so an interruption never leaves a truncated file
+        temporary = self.state_path.with_name(self.state_path.name + '.tmp')
+        temporary.write_text(json.dumps(self.state))
+        temporary.replace(self.state_path)
+
+    def report_progress(self, model, scanned, changed, last_pk, max_pk, started):
+        if self.options['verbosity'] < 1 or (scanned // self.options['batch_size']) % 10 and last_pk < max_pk:
+            return
+        rate = scanned / max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f"  {model.__name__}: pk {last_pk}/{max_pk}, {scanned} scanned, {changed} changed, {rate:.0f} rows/s"
+        )
@@ -1,11 +1,13 @@
 from datetime import datetime
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.utils.timezone import localtime
-from persiantools.jdatetime import JalaliDate
 from userauths.models import User
 
+from .calendar import GREGORIAN_MONTH_NAMES, GREGORIAN_WEEKDAY_NAMES, to_jalali
+from .leaves import leave_interval
+
 
 class WorkLog(models.Model): 
     STATUS_CHOICES = [
@@ -17,25 +19,47 @@ class WorkLog(models.Model):
     jalali_date = models.CharField(max_length=20, editable=False) 
     jalali_day_of_week = models.CharField(max_length=9, editable=False)  
     jalali_month = models.CharField(max_length=9, editable=False) 
+    jalali_year = models.PositiveSmallIntegerField(null=True, editable=False)
+    jalali_month_number = models.PositiveSmallIntegerField(null=True, editable=False)
+    jalali_day = models.PositiveSmallIntegerField(null=True, editable=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
     day_of_week = models.CharField(max_length=9, editable=False)  
     month = models.CharField(max_length=9, editable=False) 
     comment = models.TextField(null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='work_logs')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'jalali_year', 'jalali_month_number']),
+            models.Index(fields=['user', 'recorded_time', 'id']),
+            models.Index(fields=['jalali_year', 'jalali_month_number']),
+            models.Index(fields=['recorded_time']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.recorded_time:
             self.recorded_time = datetime.now()
         
-        jalali_date = JalaliDate(self.recorded_time)
-        self.jalali_date = jalali_date.strftime('%Y-%m-%d')
-        self.jalali_day_of_week = jalali_date.strftime('%A')  
-        self.jalali_month = jalali_date.strftime('%B') 
-        self.day_of_week = self.recorded_time.strftime('%A')
-        self.month = self.recorded_time.strftime('%B')
-        
-        super(WorkLog, self).save(*args, **kwargs)
+        self.set_date_fields()
+        # The derived WorkSession/WorkLogState rows are written by signal receivers;
+        # keep them in the same transaction as the log itself.
+        with transaction.atomic():
+            super(WorkLog, self).save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super(WorkLog, self).delete(*args, **kwargs)
+
+    def set_date_fields(self):
+        jalali_date = to_jalali(self.recorded_time)
+        self.jalali_date = f'{jalali_date.year:04d}-{jalali_date.month:02d}-{jalali_date.day:02d}'
+        self.jalali_day_of_week = jalali_date.weekday_name
+        self.jalali_month = jalali_date.month_name
+        self.jalali_year = jalali_date.year
+        self.jalali_month_number = jalali_date.month
+        self.jalali_day = jalali_date.day
+        self.day_of_week = GREGORIAN_WEEKDAY_NAMES[self.recorded_time.weekday()]
+        self.month = GREGORIAN_MONTH_NAMES[self.recorded_time.month]
 
     def __str__(self):
         return f"Work {self.status} on {self.recorded_time} ({self.day_of_week}, {self.month})"
@@ -47,21 +71,114 @@ class Leave(models.Model):
     jalali_leave_date = models.CharField(max_length=20, editable=False)
     jalali_day_of_week = models.CharField(max_length=9, editable=False)  
     jalali_month = models.CharField(max_length=9, editable=False) 
+    jalali_year = models.PositiveSmallIntegerField(null=True, editable=False)
+    jalali_month_number = models.PositiveSmallIntegerField(null=True, editable=False)
+    jalali_day = models.PositiveSmallIntegerField(null=True, editable=False)
     start_time = models.TimeField(null=True, blank=True)
     end_time = models.TimeField(null=True, blank=True)
     reason = models.TextField(null=True, blank=True)
+    # Half-open interval the leave covers: its hours, or the whole day
+    starts_at = models.DateTimeField(null=True, editable=False)
+    ends_at = models.DateTimeField(null=True, editable=False)
     
     class Meta:
         unique_together = ('user', 'leave_date', 'start_time', 'end_time')
+        indexes = [
+            models.Index(fields=['user', 'jalali_year', 'jalali_month_number']),
+            models.Index(fields=['jalali_year', 'jalali_month_number']),
+            models.Index(fields=['user', 'leave_date', 'id']),
+            models.Index(fields=['leave_date']),
+            models.Index(fields=['user', 'starts_at']),
+        ]
     
     
     def save(self, *args, **kwargs):
-        # Convert leave_date to Solar Hijri date
-        jalali_date = JalaliDate(self.leave_date)
-        self.jalali_leave_date = jalali_date.strftime('%Y-%m-%d')
-        self.jalali_day_of_week = jalali_date.strftime('%A')
-        self.jalali_month = jalali_date.strftime('%B')
-        
+        self.set_date_fields()
         super(Leave, self).save(*args, **kwargs)         
+
+    def set_date_fields(self):
+        # Convert leave_date to Solar Hijri date
+        jalali_date = to_jalali(self.leave_date)
+        self.jalali_leave_date = f'{jalali_date.year:04d}-{jalali_date.month:02d}-{jalali_date.day:02d}'
+        self.jalali_day_of_week = jalali_date.weekday_name
+        self.jalali_month = jalali_date.month_name
+        self.jalali_year = jalali_date.year
+        self.jalali_month_number = jalali_date.month
+        self.jalali_day = jalali_date.day
+        self.starts_at, self.ends_at = leave_interval(self.leave_date, self.start_time, self.end_time)
+
     def __str__(self):
         return f"{self.user.username} - {self.leave_date} ({self.start_time} to {self.end_time})"
+
+
+class WorkSession(models.Model):
+    """
+    A paired 'started'/'ended' interval derived from a user's WorkLog events.
+    Rows are maintained by the WorkLog signal receivers, never edited directly.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='work_sessions')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    duration_seconds = models.PositiveIntegerField()
+    jalali_year = models.PositiveSmallIntegerField()
+    jalali_month_number = models.PositiveSmallIntegerField()
+    jalali_day = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'start']),
+            models.Index(fields=['user', 'jalali_year', 'jalali_month_number']),
+            models.Index(fields=['start']),
+        ]
+
+    def __str__(self):
+        return f"Session {self.start} - {self.end} ({self.duration_seconds}s)"
+
+
+class WorkLogState(models.Model):
+    """
+    Latest clock event of a user, so a new event can be validated with a single read.
+    Kept in sync by the WorkLog signal receivers.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='worklog_state')
+    last_status = models.CharField(max_length=10, choices=WorkLog.STATUS_CHOICES, null=True, blank=True)
+    last_recorded_time = models.DateTimeField(null=True, blank=True)
+    open_session_start = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Users clocked in right now (worklog/presence.py)
+            models.Index(fields=['open_session_start']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.last_status} at {self.last_recorded_time}"
+
+
+class DailyRollup(models.Model):
+    """
+    A user's worked time and leave on one day, so yearly and multi-month reports read at
+    most one small row per user-day. Only days with any activity have a row. Refreshed for
+    the days a WorkLog/Leave write touches (worklog/rollups.py); `manage.py rebuild_rollups`
+    recomputes chosen ranges from WorkSession and Leave.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    jalali_year = models.PositiveSmallIntegerField()
+    jalali_month_number = models.PositiveSmallIntegerField()
+    jalali_day = models.PositiveSmallIntegerField()
+    # Sessions count on the day they started, like WorkSession's Jalali fields
+    worked_seconds = models.PositiveIntegerField(default=0)
+    session_count = models.PositiveSmallIntegerField(default=0)
+    full_day_leave = models.BooleanField(default=False)
+    leave_seconds = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'date')
+        indexes = [
+            models.Index(fields=['user', 'jalali_year', 'jalali_month_number']),
+            models.Index(fields=['jalali_year', 'jalali_month_number']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.date}: {self.worked_seconds}s worked, {self.leave_seconds}s leave"
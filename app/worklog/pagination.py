@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class WorkLogCursorPagination(CursorPagination):
+    """Keyset pagination over (recorded_time, id), backed by the (user, recorded_time, id) index."""
+    ordering = ('recorded_time', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class LeaveCursorPagination(CursorPagination):
+    """Keyset pagination over (leave_date, id), backed by the (user, leave_date, id) index."""
+    ordering = ('leave_date', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,69 @@
+"""
+Who is clocked in right now.
+
+Every user's open session start is kept on WorkLogState.open_session_start (indexed),
+so the list is a single query whatever the headcount. A version number in the default
+cache is bumped whenever a user clocks in or out, which lets clients long-poll for a
+change; with the per-process locmem cache only changes made by the same process are
+seen, so use a shared CACHE_BACKEND when running several workers.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import WorkLogState
+
+PRESENCE_VERSION_KEY = 'presence:version'
+
+
+def presence_version():
+    version = cache.get(PRESENCE_VERSION_KEY)
+    if version is None:
+        cache.add(PRESENCE_VERSION_KEY, 1, None)
+        version = cache.get(PRESENCE_VERSION_KEY, 1)
+    return version
+
+
+def bump_presence_version():
+    try:
+        cache.incr(PRESENCE_VERSION_KEY)
+    except ValueError:
+        # Missing (first change, or evicted): any new value wakes the waiting clients
+        cache.set(PRESENCE_VERSION_KEY, int(time.time() * 1000), None)
+
+
+def presence_changed_on_commit():
+    # Bumping before commit would let a woken client read the old rows
+    transaction.on_commit(bump_presence_version)
+
+
+def who_is_working():
+    """Users with an open 'started' session, longest-working first."""
+    moment = now()
+    states = WorkLogState.objects.filter(
+        open_session_start__isnull=False
+    ).select_related('user').only(
+        'open_session_start', 'user__username', 'user__telegram_id'
+    ).order_by('open_session_start')
+    return [
+        {
+            'user_id': state.user_id,
+            'username': state.user.username,
+            'telegram_id': state.user.telegram_id,
+            'started_at': state.open_session_start,
+            'elapsed_seconds': int((moment - state.open_session_start).total_seconds()),
+        }
+        for state in states
+    ]
+
+
+def wait_for_presence_change(version, timeout, interval=0.5):
+    """Return the current version as soon as it differs from `version`, or after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    current = presence_version()
+    while current == version and time.monotonic() < deadline:
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+        current = presence_version()
+    return current
@@ -0,0 +1,147 @@
+import hashlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from userauths.models import User
+
+from .cache import get_or_set_heatmap
+from .calendar import year_range
+from .exports import EXPORT_FORMATS, EXPORTS, export_queryset, parse_period
+from .presence import presence_version, wait_for_presence_change, who_is_working
+from .reports import monthly_timesheet, yearly_heatmap, yearly_timesheet
+
+
+class ExportView(APIView):
+    """
+    Stream worklogs, work sessions or leaves as CSV or an XLSX workbook.
+
+    Query parameters: `start`/`end` or `jalali_start`/`jalali_end` (YYYY-MM-DD, inclusive),
+    `user` (staff only; everyone else always exports their own rows) and `file_format`
+    (`csv`, the default, or `xlsx`; DRF keeps `format` for itself).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, kind):
+        if kind not in EXPORTS:
+            return Response({"error": f"Unknown export '{kind}'."}, status=status.HTTP_404_NOT_FOUND)
+
+        params = request.query_params
+        file_format = params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"file_format must be one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            first, last = parse_period(
+                params.get('start'), params.get('end'),
+                params.get('jalali_start'), params.get('jalali_end')
+            )
+        except ValueError:
+            return Response({"error": "Invalid date. Use 'YYYY-MM-DD'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.user.pk
+        if request.user.is_staff:
+            try:
+                user_id = int(params['user']) if params.get('user') else None
+            except ValueError:
+                return Response({"error": "user must be a user id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = export_queryset(kind, first, last, user_id)
+        content_type, iter_rows = EXPORT_FORMATS[file_format]
+        response = StreamingHttpResponse(iter_rows(kind, queryset), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{file_format}"'
+        return response
+
+
+class MonthlyTimesheetView(APIView):
+    """Hours, sessions and leaves of every user for one Jalali month."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, jalali_year, jalali_month):
+        return Response({
+            'jalali_year': jalali_year,
+            'jalali_month': jalali_month,
+            'users': monthly_timesheet(jalali_year, jalali_month)
+        })
+
+
+class YearlyTimesheetView(APIView):
+    """Hours, sessions and leaves of every active user per month of one Jalali year."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, jalali_year):
+        return Response({
+            'jalali_year': jalali_year,
+            'users': yearly_timesheet(jalali_year)
+        })
+
+
+class YearlyHeatmapView(APIView):
+    """
+    Worked minutes, sessions and leave of every day of one Jalali year, as parallel lists.
+
+    Query parameters (staff only): `user` for another user's year, or `group` (an auth
+    group name) for the day-by-day sums over its active members. Everyone else always
+    gets their own year. Answers are cached until a write touches that year.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, jalali_year):
+        try:
+            year_range(jalali_year)
+        except ValueError:
+            return Response({"error": "Invalid Jalali year."}, status=status.HTTP_400_BAD_REQUEST)
+
+        params = request.query_params
+        user_ids = [request.user.pk]
+        scope = f'user:{request.user.pk}'
+        if request.user.is_staff and 'group' in params:
+            user_ids = list(User.objects.filter(
+                groups__name=params['group'], is_active=True
+            ).order_by('pk').values_list('pk', flat=True))
+            if not user_ids:
+                return Response({"error": "No active users in this group."}, status=status.HTTP_404_NOT_FOUND)
+            # Key on the members themselves, so joining or leaving the group changes the entry
+            scope = 'users:' + hashlib.sha1(','.join(map(str, user_ids)).encode()).hexdigest()
+        elif request.user.is_staff and 'user' in params:
+            try:
+                user_ids = [int(params['user'])]
+            except ValueError:
+                return Response({"error": "user must be a user id."}, status=status.HTTP_400_BAD_REQUEST)
+            scope = f'user:{user_ids[0]}'
+
+        return Response(get_or_set_heatmap(jalali_year, scope, lambda: yearly_heatmap(jalali_year, user_ids)))
+
+
+class PresenceView(APIView):
+    """
+    Every user clocked in right now, with their start time and elapsed seconds.
+
+    Long-poll by passing the `version` of the previous answer and `wait` (seconds, up to
+    PRESENCE_MAX_WAIT): the answer comes as soon as someone clocks in or out, or when the
+    wait is over with the same version. Each waiting request holds a worker thread.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        if 'wait' in params:
+            try:
+                wait = min(float(params['wait']), settings.PRESENCE_MAX_WAIT)
+                version = int(params['version'])
+            except (KeyError, ValueError):
+                return Response(
+                    {"error": "wait needs a number of seconds and the integer version of the previous answer."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            current = wait_for_presence_change(version, max(wait, 0))
+        else:
+            current = presence_version()
+
+        users = who_is_working()
+        return Response({'version': current, 'count': len(users), 'users': users})
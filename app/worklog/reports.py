@@ -0,0 +1,117 @@
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from userauths.models import User
+
+from .calendar import year_range
+from .models import DailyRollup
+
+# Sums the DailyRollup rows of the month: at most 31 per user, read through the
+# (user, jalali_year, jalali_month_number) index. Sessions count in the month they started.
+MONTHLY_TIMESHEET_SQL = """
+SELECT u.id, u.username,
+       COALESCE(SUM(r.worked_seconds), 0), COALESCE(SUM(r.session_count), 0),
+       COALESCE(SUM(r.full_day_leave), 0), COALESCE(SUM(r.leave_seconds), 0)
+FROM {user} u
+LEFT JOIN {rollup} r
+       ON r.user_id = u.id AND r.jalali_year = %(year)s AND r.jalali_month_number = %(month)s
+GROUP BY u.id, u.username
+HAVING u.is_active OR COUNT(r.id) > 0
+ORDER BY u.username
+"""
+
+
+def monthly_timesheet(jalali_year, jalali_month):
+    """Worked time, session count and leaves of every user for one Jalali month, in one query."""
+    sql = MONTHLY_TIMESHEET_SQL.format(rollup=DailyRollup._meta.db_table, user=User._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'year': jalali_year, 'month': jalali_month})
+        rows = cursor.fetchall()
+
+    return [
+        {
+            'user_id': user_id,
+            'username': username,
+            'worked_seconds': worked_seconds,
+            'worked_hours': round(worked_seconds / 3600, 2),
+            'session_count': session_count,
+            'full_day_leaves': full_day_leaves,
+            'hourly_leave_hours': round(leave_seconds / 3600, 2),
+        }
+        for user_id, username, worked_seconds, session_count, full_day_leaves, leave_seconds in rows
+    ]
+
+
+def yearly_timesheet(jalali_year, user_ids=None):
+    """
+    Worked time, sessions and leaves per Jalali month of one year, for every user with
+    any activity in it (or for `user_ids`), from one grouped query over DailyRollup.
+    """
+    rollups = DailyRollup.objects.filter(jalali_year=jalali_year)
+    if user_ids is not None:
+        rollups = rollups.filter(user_id__in=user_ids)
+    rows = rollups.values('user_id', 'user__username', 'jalali_month_number').annotate(
+        worked_seconds=Sum('worked_seconds'),
+        session_count=Sum('session_count'),
+        full_day_leaves=Count('id', filter=Q(full_day_leave=True)),
+        leave_seconds=Sum('leave_seconds'),
+    ).order_by('user__username', 'user_id', 'jalali_month_number')
+
+    users = {}
+    for row in rows:
+        user = users.setdefault(row['user_id'], {
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'worked_hours': 0,
+            'months': {month: None for month in range(1, 13)},
+        })
+        user['months'][row['jalali_month_number']] = {
+            'worked_hours': round(row['worked_seconds'] / 3600, 2),
+            'session_count': row['session_count'],
+            'full_day_leaves': row['full_day_leaves'],
+            'hourly_leave_hours': round(row['leave_seconds'] / 3600, 2),
+        }
+        user['worked_hours'] += row['worked_seconds']
+
+    for user in users.values():
+        user['worked_hours'] = round(user['worked_hours'] / 3600, 2)
+        user['months'] = [
+            stats or {'worked_hours': 0, 'session_count': 0, 'full_day_leaves': 0, 'hourly_leave_hours': 0}
+            for stats in user['months'].values()
+        ]
+    return list(users.values())
+
+
+def yearly_heatmap(jalali_year, user_ids):
+    """
+    Day-by-day totals of `user_ids` over one Jalali year, summed across the users by one
+    grouped query over DailyRollup. Each list holds one number per day of the year,
+    starting at `first_date` (1 Farvardin); `full_day_leaves` counts users on leave that day.
+    """
+    first_day, next_year = year_range(jalali_year)
+    days = (next_year - first_day).days
+    worked_minutes, session_counts = [0] * days, [0] * days
+    leave_minutes, full_day_leaves = [0] * days, [0] * days
+
+    rows = DailyRollup.objects.filter(jalali_year=jalali_year, user_id__in=user_ids).values('date').annotate(
+        worked_seconds=Sum('worked_seconds'),
+        session_count=Sum('session_count'),
+        leave_seconds=Sum('leave_seconds'),
+        full_day_leaves=Count('id', filter=Q(full_day_leave=True)),
+    ).order_by()
+    for row in rows:
+        index = (row['date'] - first_day).days
+        worked_minutes[index] = row['worked_seconds'] // 60
+        session_counts[index] = row['session_count']
+        leave_minutes[index] = row['leave_seconds'] // 60
+        full_day_leaves[index] = row['full_day_leaves']
+
+    return {
+        'jalali_year': jalali_year,
+        'first_date': first_day,
+        'days': days,
+        'user_count': len(user_ids),
+        'worked_minutes': worked_minutes,
+        'session_counts': session_counts,
+        'leave_minutes': leave_minutes,
+        'full_day_leaves': full_day_leaves,
+    }
@@ -0,0 +1,100 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils.timezone import is_naive, localtime, make_aware
+
+from .cache import evict_heatmaps_on_commit
+from .calendar import to_jalali
+from .leaves import totals_aggregates
+from .models import DailyRollup, Leave, WorkSession
+
+
+def local_date(moment):
+    if isinstance(moment, datetime):
+        return localtime(make_aware(moment) if is_naive(moment) else moment).date()
+    return moment
+
+
+def new_rollup(user_id, day, **totals):
+    jalali_date = to_jalali(day)
+    return DailyRollup(
+        user_id=user_id,
+        date=day,
+        jalali_year=jalali_date.year,
+        jalali_month_number=jalali_date.month,
+        jalali_day=jalali_date.day,
+        **totals
+    )
+
+
+def compute_daily_rollups(user_ids, first_day, last_day):
+    """
+    Unsaved DailyRollup rows of the users' active days from first_day through last_day,
+    from one grouped query over WorkSession and one over Leave.
+    """
+    rollups = {}
+
+    def rollup(user_id, day):
+        if (user_id, day) not in rollups:
+            rollups[user_id, day] = new_rollup(user_id, day)
+        return rollups[user_id, day]
+
+    sessions = WorkSession.objects.filter(
+        user_id__in=user_ids,
+        start__gte=make_aware(datetime.combine(first_day, time.min)),
+        start__lt=make_aware(datetime.combine(last_day + timedelta(days=1), time.min)),
+    ).annotate(day=TruncDate('start')).values('user_id', 'day').annotate(
+        worked_seconds=Sum('duration_seconds'), session_count=Count('id')
+    ).order_by()
+    for row in sessions:
+        day_rollup = rollup(row['user_id'], row['day'])
+        day_rollup.worked_seconds = row['worked_seconds']
+        day_rollup.session_count = row['session_count']
+
+    leaves = Leave.objects.filter(
+        user_id__in=user_ids, leave_date__range=(first_day, last_day)
+    ).values('user_id', 'leave_date').annotate(**totals_aggregates()).order_by()
+    for row in leaves:
+        day_rollup = rollup(row['user_id'], row['leave_date'])
+        day_rollup.full_day_leave = row['full_days'] > 0
+        if row['hourly_duration']:
+            day_rollup.leave_seconds = int(row['hourly_duration'].total_seconds())
+
+    return list(rollups.values())
+
+
+def refresh_daily_rollups(user_ids, first_day, last_day):
+    """Recompute the users' DailyRollup rows from first_day through last_day; returns the row count."""
+    first_day, last_day = local_date(first_day), local_date(last_day)
+    rows = compute_daily_rollups(user_ids, first_day, last_day)
+    with transaction.atomic():
+        DailyRollup.objects.filter(user_id__in=user_ids, date__range=(first_day, last_day)).delete()
+        DailyRollup.objects.bulk_create(rows, batch_size=1000)
+        evict_heatmaps_on_commit(first_day, last_day)
+    return len(rows)
+
+
+def refresh_worklog_rollups(user_id, anchor, *moments):
+    """
+    Refresh the days refresh_work_sessions may have re-paired: its sessions from `anchor`
+    on start at one of the user's logs, so `moments` must include the time of their latest
+    log, along with any other time the change touched (e.g. that of a deleted log).
+    """
+    last_day = max(local_date(moment) for moment in (anchor, *moments) if moment is not None)
+    refresh_daily_rollups([user_id], anchor, last_day)
+
+
+def add_session_to_rollups(session):
+    """Count one new WorkSession in the DailyRollup of its start day, without recomputing the day."""
+    day = local_date(session.start)
+    updated = DailyRollup.objects.filter(user_id=session.user_id, date=day).update(
+        worked_seconds=F('worked_seconds') + session.duration_seconds,
+        session_count=F('session_count') + 1,
+    )
+    if not updated:
+        new_rollup(
+            session.user_id, day, worked_seconds=session.duration_seconds, session_count=1
+        ).save(force_insert=True)
+    evict_heatmaps_on_commit(day, day)
@@ -1,15 +1,17 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
+from django.db import transaction
 from persiantools.jdatetime import JalaliDate
 from rest_framework import serializers
 from userauths.models import User
 
+from worklog.calendar import to_gregorian
 from worklog.models import Leave, WorkLog
 
 from worklog.validators import validate_leave_overlap, validate_worklog
 
 class WorkLogSerializer(serializers.ModelSerializer):
-    user_id = serializers.IntegerField(source='user.id', read_only=True)
+    user_id = serializers.IntegerField(read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
@@ -23,18 +25,18 @@ class TelegramWorkLogSerializer(serializers.ModelSerializer):
         fields = ['status', 'comment', 'recorded_time']
 
     def validate(self, data):
-        # Get the telegram_id from the context
-        telegram_id = self.context.get('telegram_id')
+        # Get the user resolved from the telegram_id by the view
+        user_id = self.context.get('user_id')
         # Extract status and recorded_time from the data
         status = data.get('status')
         recorded_time = data.get('recorded_time', datetime.now())  # Default to now if not provided
 
-        # Ensure telegram_id is present
-        if not telegram_id:
+        # Ensure the user is present
+        if not user_id:
             raise serializers.ValidationError("Telegram ID is required.")
 
         # Call the validate_worklog function to perform all necessary validation checks
-        validate_worklog(telegram_id, status, recorded_time)
+        validate_worklog(user_id, status, recorded_time)
 
         # Return the validated data
         return data
@@ -52,25 +54,48 @@ class TelegramLeaveSerializer(serializers.ModelSerializer):
         
 
 
+def create_leave_days(leave_date, end_date=None, **fields):
+    """
+    Store a leave as one row per day from leave_date through end_date, so the per-day
+    totals and Jalali month filters keep working. Returns the first day's row.
+    """
+    days = (end_date - leave_date).days + 1 if end_date else 1
+    with transaction.atomic():
+        leaves = [
+            Leave.objects.create(leave_date=leave_date + timedelta(days=offset), **fields)
+            for offset in range(days)
+        ]
+    leave = leaves[0]
+    if end_date:
+        leave.end_date = end_date
+    return leave
+
+
 class TelegramJalaliLeaveSerializer(serializers.ModelSerializer):
+    # Last day of a multi-day leave
+    end_date = serializers.DateField(required=False, allow_null=True)
+
     class Meta:
         model = Leave
-        fields = ['leave_date', 'start_time', 'end_time', 'reason']
+        fields = ['leave_date', 'end_date', 'start_time', 'end_time', 'reason']
 
     def validate(self, data):
-        telegram_id = self.context.get('telegram_id')
+        user_id = self.context.get('user_id')
 
-        if not telegram_id:
+        if not user_id:
             raise serializers.ValidationError("Telegram ID is required.")
 
         leave_date = data['leave_date']
         start_time = data.get('start_time')
         end_time = data.get('end_time')
 
-        validate_leave_overlap(telegram_id, leave_date, start_time, end_time)
+        validate_leave_overlap(user_id, leave_date, start_time, end_time, data.get('end_date'))
 
         return data
 
+    def create(self, validated_data):
+        return create_leave_days(**validated_data)
+
 # class TelegramJalaliLeaveSerializer(serializers.ModelSerializer):
         
 #     jalali_leave_date = serializers.CharField(max_length=20, required=True)
@@ -120,9 +145,7 @@ class JalaliLeaveSerializer(serializers.ModelSerializer):
         try:
             # Manually parse the Jalali date string
             jalali_year, jalali_month, jalali_day = map(int, data['jalali_leave_date'].split('-'))
-            jalali_date = JalaliDate(jalali_year, jalali_month, jalali_day)
-            gregorian_date = jalali_date.to_gregorian()
-            data['leave_date'] = gregorian_date
+            data['leave_date'] = to_gregorian(jalali_year, jalali_month, jalali_day)
         except ValueError:
             raise serializers.ValidationError("Invalid Jalali date format. Use 'YYYY-MM-DD'.")
         
@@ -0,0 +1,145 @@
+from django.db import transaction
+from django.db.models import Sum
+from django.utils.timezone import is_naive, make_aware
+
+from .calendar import to_jalali
+from .models import WorkLog, WorkLogState, WorkSession
+from .presence import presence_changed_on_commit
+
+
+def pair_work_sessions(logs):
+    """
+    Pair 'started'/'ended' logs (ordered by recorded_time) into (start, end) tuples.
+    A 'started' log replaces any unmatched earlier one and an 'ended' log without
+    an open start is ignored, the same way the monthly views always counted time.
+    """
+    sessions = []
+    current_start_time = None
+
+    for log in logs:
+        if log.status == 'started':
+            current_start_time = log.recorded_time
+        elif log.status == 'ended' and current_start_time:
+            sessions.append((current_start_time, log.recorded_time))
+            current_start_time = None
+
+    return sessions
+
+
+def build_work_session(user_id, start, end):
+    jalali_date = to_jalali(start)
+    return WorkSession(
+        user_id=user_id,
+        start=start,
+        end=end,
+        duration_seconds=int((end - start).total_seconds()),
+        jalali_year=jalali_date.year,
+        jalali_month_number=jalali_date.month,
+        jalali_day=jalali_date.day,
+    )
+
+
+def refresh_work_sessions(user_id, since):
+    """
+    Re-pair the user's sessions from the first event that a change at `since` can affect.
+
+    Only the log right before `since` matters: if it is 'started' it may now pair with
+    a different 'ended' log, otherwise no session can span `since`. Everything before
+    that anchor is left untouched, so appending a clock event re-pairs just a row or two.
+    Returns the anchor.
+    """
+    previous_log = WorkLog.objects.filter(
+        user_id=user_id,
+        recorded_time__lt=since
+    ).order_by('-recorded_time', '-id').only('status', 'recorded_time').first()
+
+    anchor = since
+    if previous_log and previous_log.status == 'started':
+        anchor = previous_log.recorded_time
+
+    WorkSession.objects.filter(user_id=user_id, start__gte=anchor).delete()
+
+    logs = WorkLog.objects.filter(
+        user_id=user_id,
+        recorded_time__gte=anchor
+    ).order_by('recorded_time', 'id').only('status', 'recorded_time')
+
+    WorkSession.objects.bulk_create([
+        build_work_session(user_id, start, end)
+        for start, end in pair_work_sessions(logs.iterator())
+    ])
+    return anchor
+
+
+def latest_worklog(user_id):
+    """The user's chronologically latest log (status and recorded_time only), or None."""
+    return WorkLog.objects.filter(user_id=user_id).order_by(
+        '-recorded_time', '-id'
+    ).only('status', 'recorded_time').first()
+
+
+def refresh_worklog_state(user_id, last_log):
+    """Point the user's WorkLogState at `last_log`, their latest log (see latest_worklog)."""
+    defaults = {'last_status': None, 'last_recorded_time': None, 'open_session_start': None}
+    if last_log:
+        defaults['last_status'] = last_log.status
+        defaults['last_recorded_time'] = last_log.recorded_time
+        if last_log.status == 'started':
+            defaults['open_session_start'] = last_log.recorded_time
+
+    with transaction.atomic():
+        state, created = WorkLogState.objects.select_for_update().get_or_create(user_id=user_id, defaults=defaults)
+        previous_start = None if created else state.open_session_start
+        if not created:
+            for field, value in defaults.items():
+                setattr(state, field, value)
+            state.save(update_fields=list(defaults))
+
+    if previous_start != defaults['open_session_start']:
+        presence_changed_on_commit()
+
+
+def append_worklog(log):
+    """
+    Fast path of refresh_work_sessions and refresh_worklog_state for a new log later than
+    all of its user's others, i.e. the usual clock event. The user's WorkLogState (locked
+    here) still describes the previous latest log, which is all the pairing needs.
+
+    Returns (anchor, session): the start of the session the log closed, saved, or the log's
+    own time and None. Returns None when the log is not the latest, or the user has no
+    state row, and the caller has to refresh from the history instead.
+    """
+    recorded_time = log.recorded_time
+    if is_naive(recorded_time):
+        recorded_time = make_aware(recorded_time)
+
+    # Part of the log's own transaction (WorkLog.save), so no savepoint of its own
+    with transaction.atomic(savepoint=False):
+        state = WorkLogState.objects.select_for_update().filter(pk=log.user_id).first()
+        if state is None or (state.last_recorded_time is not None and recorded_time <= state.last_recorded_time):
+            return None
+
+        # The same rules as pair_work_sessions, applied to one more log
+        session = None
+        previous_start = state.open_session_start
+        if log.status == 'started':
+            state.open_session_start = recorded_time
+        elif previous_start is not None:
+            session = build_work_session(log.user_id, previous_start, recorded_time)
+            session.save()
+            state.open_session_start = None
+        state.last_status = log.status
+        state.last_recorded_time = recorded_time
+        state.save(update_fields=['last_status', 'last_recorded_time', 'open_session_start'])
+
+    if previous_start != state.open_session_start:
+        presence_changed_on_commit()
+    return (session.start if session else recorded_time), session
+
+
+def total_session_seconds(queryset):
+    return queryset.aggregate(total=Sum('duration_seconds'))['total'] or 0
+
+
+async def atotal_session_seconds(queryset):
+    return (await queryset.aaggregate(total=Sum('duration_seconds')))['total'] or 0
@@ -1,10 +1,123 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils.timezone import is_naive, make_aware
 from rest_framework.authtoken.models import Token
 from userauths.models import User
 
+from . import telegram_users
+from .cache import evict_summaries_on_commit
+from .models import Leave, WorkLog, WorkLogState
+from .presence import presence_changed_on_commit
+from .rollups import add_session_to_rollups, refresh_daily_rollups, refresh_worklog_rollups
+from .sessions import append_worklog, latest_worklog, refresh_work_sessions, refresh_worklog_state
+
 @receiver(post_save, sender=User)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def evict_telegram_user_on_save(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only, which cannot change the mapping
+    if update_fields is not None and 'telegram_id' not in update_fields:
+        return
+    telegram_users.evict_user(instance.pk, instance.telegram_id)
+
+
+@receiver(post_delete, sender=User)
+def evict_telegram_user_on_delete(sender, instance, **kwargs):
+    telegram_users.evict_user(instance.pk, instance.telegram_id)
+
+
+def refresh_worklog_derived_rows(user_id, since, *moments):
+    """Re-pair the user's history from `since`, then their state, rollups and cached summaries."""
+    anchor = refresh_work_sessions(user_id, since)
+    latest = latest_worklog(user_id)
+    refresh_worklog_state(user_id, latest)
+    refresh_worklog_rollups(user_id, anchor, *moments, latest and latest.recorded_time)
+    evict_summaries_on_commit('worklog', user_id, anchor, *moments)
+
+
+@receiver(pre_save, sender=WorkLog)
+def remember_previous_worklog(sender, instance, **kwargs):
+    # Keep the stored time/owner so an edit can re-pair the history it moved away from
+    instance._previous = None
+    if not instance._state.adding:
+        instance._previous = WorkLog.objects.filter(pk=instance.pk).values(
+            'user_id', 'recorded_time'
+        ).first()
+
+
+@receiver(post_save, sender=WorkLog)
+def update_derived_rows_on_save(sender, instance, created=False, **kwargs):
+    # The usual clock event comes after every other log of its user: the state row alone pairs it
+    if created:
+        appended = append_worklog(instance)
+        if appended is not None:
+            anchor, session = appended
+            if session is not None:
+                add_session_to_rollups(session)
+            evict_summaries_on_commit('worklog', instance.user_id, anchor, instance.recorded_time)
+            return
+
+    previous = getattr(instance, '_previous', None)
+    if previous and previous['user_id'] != instance.user_id:
+        refresh_worklog_derived_rows(previous['user_id'], previous['recorded_time'], previous['recorded_time'])
+        previous = None
+
+    recorded_time = instance.recorded_time
+    if is_naive(recorded_time):
+        recorded_time = make_aware(recorded_time)
+    # An edit touches both the months the log left and the one it moved to
+    moments = [recorded_time]
+    if previous:
+        moments.append(previous['recorded_time'])
+    refresh_worklog_derived_rows(instance.user_id, min(moments), *moments)
+
+
+@receiver(post_delete, sender=WorkLog)
+def update_derived_rows_on_delete(sender, instance, origin=None, **kwargs):
+    # When the user is being deleted their derived rows go with them
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and origin_model is not WorkLog:
+        return
+    refresh_worklog_derived_rows(instance.user_id, instance.recorded_time, instance.recorded_time)
+
+
+@receiver(pre_save, sender=Leave)
+def remember_previous_leave(sender, instance, **kwargs):
+    instance._previous = None
+    if not instance._state.adding:
+        instance._previous = Leave.objects.filter(pk=instance.pk).values(
+            'user_id', 'leave_date'
+        ).first()
+
+
+@receiver(post_save, sender=Leave)
+def update_leave_derived_rows_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        refresh_daily_rollups([previous['user_id']], previous['leave_date'], previous['leave_date'])
+        evict_summaries_on_commit('leave', previous['user_id'], previous['leave_date'])
+    refresh_daily_rollups([instance.user_id], instance.leave_date, instance.leave_date)
+    evict_summaries_on_commit('leave', instance.user_id, instance.leave_date)
+
+
+@receiver(post_delete, sender=Leave)
+def update_leave_derived_rows_on_delete(sender, instance, origin=None, **kwargs):
+    evict_summaries_on_commit('leave', instance.user_id, instance.leave_date)
+    # When the user is being deleted their rollups go with them
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and origin_model is not Leave:
+        return
+    refresh_daily_rollups([instance.user_id], instance.leave_date, instance.leave_date)
+
+
+@receiver(post_delete, sender=WorkLogState)
+def update_presence_on_state_delete(sender, instance, **kwargs):
+    # Deleting a user takes their state row, and their open session, with it
+    if instance.open_session_start is not None:
+        presence_changed_on_commit()
@@ -0,0 +1,204 @@
+"""
+Async versions of the Telegram endpoints, built on Django's async ORM.
+
+DRF viewsets are sync only, so under an ASGI server every bot request would hold a
+thread of the sync_to_async pool. These views serve the same URLs and payloads from
+the event loop instead; api/urls.py routes to them when TELEGRAM_ASYNC_VIEWS is set.
+"""
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+from userauths.models import User
+
+from .cache import aget_or_set_summary
+from .calendar import month_datetime_range
+from .leaves import aleave_totals
+from .models import Leave, WorkLog, WorkSession
+from .serializers import (LeaveSerializer, TelegramJalaliLeaveSerializer,
+                          TelegramWorkLogSerializer, WorkLogSerializer, create_leave_days)
+from .sessions import atotal_session_seconds
+from .telegram_users import aget_user_id
+from .validators import avalidate_leave_overlap, avalidate_worklog
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return JsonResponse(data, status=status, safe=False, encoder=DjangoJSONEncoder)
+
+
+def error_response(exc):
+    return json_response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def parse_body(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError as exc:
+            raise ValidationError({"error": f"Invalid JSON body: {exc}"}) from exc
+    return request.POST
+
+
+# Same error bodies as the sync viewsets: the create endpoints report it as a validation error
+UNKNOWN_USER = {"non_field_errors": ["User with this telegram_id does not exist."]}
+
+
+async def get_telegram_user_id(request, telegram_id, error=None):
+    try:
+        return await aget_user_id(telegram_id, request)
+    except User.DoesNotExist as exc:
+        raise ValidationError(
+            error or {"error": f"User with telegram_id {telegram_id} does not exist."}
+        ) from exc
+
+
+class FieldsOnlyMixin:
+    # The field checks need no database; the rules in validate() run through the async validators
+    def validate(self, data):
+        return data
+
+
+class AsyncTelegramWorkLogSerializer(FieldsOnlyMixin, TelegramWorkLogSerializer):
+    pass
+
+
+class AsyncTelegramJalaliLeaveSerializer(FieldsOnlyMixin, TelegramJalaliLeaveSerializer):
+    pass
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncTelegramWorkLogView(View):
+
+    async def post(self, request, telegram_id):
+        try:
+            user_id = await get_telegram_user_id(request, telegram_id, UNKNOWN_USER)
+            serializer = AsyncTelegramWorkLogSerializer(data=parse_body(request))
+            serializer.is_valid(raise_exception=True)
+            data = serializer.validated_data
+            try:
+                await avalidate_worklog(user_id, data.get('status'), data.get('recorded_time', datetime.now()))
+            except ValidationError as exc:
+                raise ValidationError(as_serializer_error(exc)) from exc
+
+            work_log = await WorkLog.objects.acreate(user_id=user_id, **data)
+            return json_response(serializer.to_representation(work_log), status=status.HTTP_201_CREATED)
+        except ValidationError as e:
+            return error_response(e)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncTelegramLeaveView(View):
+
+    async def post(self, request, telegram_id):
+        try:
+            user_id = await get_telegram_user_id(request, telegram_id, UNKNOWN_USER)
+            serializer = AsyncTelegramJalaliLeaveSerializer(data=parse_body(request))
+            serializer.is_valid(raise_exception=True)
+            data = dict(serializer.validated_data)
+            # Not a Leave field; may be present but null
+            end_date = data.pop('end_date', None)
+            try:
+                await avalidate_leave_overlap(
+                    user_id, data['leave_date'], data.get('start_time'), data.get('end_time'), end_date
+                )
+            except ValidationError as exc:
+                raise ValidationError(as_serializer_error(exc)) from exc
+
+            if end_date:
+                # Several rows in one transaction; the async ORM has no atomic blocks
+                leave = await sync_to_async(create_leave_days)(user_id=user_id, end_date=end_date, **data)
+            else:
+                leave = await Leave.objects.acreate(user_id=user_id, **data)
+            return json_response(serializer.to_representation(leave), status=status.HTTP_201_CREATED)
+        except ValidationError as e:
+            return error_response(e)
+
+
+class AsyncTelegramJalaliMonthlyWorkLogView(View):
+
+    async def get_summary(self, user_id, jalali_year, jalali_month):
+        try:
+            start_date, end_date = month_datetime_range(jalali_year, jalali_month)
+        except ValueError as exc:
+            raise ValidationError({"error": "Invalid Jalali date."}) from exc
+
+        work_logs = [
+            log async for log in WorkLog.objects.filter(
+                user_id=user_id,
+                recorded_time__range=(start_date, end_date)
+            ).order_by('recorded_time')
+        ]
+
+        total_seconds = await atotal_session_seconds(WorkSession.objects.filter(
+            user_id=user_id,
+            jalali_year=jalali_year,
+            jalali_month_number=jalali_month
+        ))
+
+        days, remainder = divmod(total_seconds, 86400)
+        hours, remainder = divmod(remainder, 3600)
+        minutes, _ = divmod(remainder, 60)
+
+        return {
+            'work_logs': WorkLogSerializer(work_logs, many=True).data,
+            'total_hours': {
+                'days': int(days),
+                'hours': int(hours),
+                'minutes': int(minutes)
+            }
+        }
+
+    async def get(self, request, telegram_id, jalali_year, jalali_month):
+        try:
+            user_id = await get_telegram_user_id(request, telegram_id)
+            response_data = await aget_or_set_summary(
+                'worklog', user_id, 'jalali', jalali_year, jalali_month,
+                lambda: self.get_summary(user_id, int(jalali_year), int(jalali_month))
+            )
+            return json_response(response_data)
+        except ValidationError as e:
+            return error_response(e)
+
+
+class AsyncTelegramJalaliMonthlyLeaveView(View):
+
+    async def get_summary(self, user_id, jalali_year, jalali_month):
+        queryset = Leave.objects.filter(
+            user_id=user_id,
+            jalali_year=int(jalali_year),
+            jalali_month_number=int(jalali_month)
+        ).order_by('leave_date', 'start_time')
+
+        leave_records = [leave async for leave in queryset]
+        total_days, _, total_hours = await aleave_totals(queryset)
+
+        total_hours_in_hours = total_hours.total_seconds() // 3600
+        total_minutes_in_minutes = (total_hours.total_seconds() % 3600) // 60
+
+        return {
+            'leave_records': LeaveSerializer(leave_records, many=True).data,
+            'total_days': total_days,
+            'total_hours': int(total_hours_in_hours),
+            'total_minutes': int(total_minutes_in_minutes),
+            'jalali_year': jalali_year,
+            'jalali_month': jalali_month
+        }
+
+    async def get(self, request, telegram_id, jalali_year, jalali_month):
+        try:
+            user_id = await get_telegram_user_id(request, telegram_id)
+            response_data = await aget_or_set_summary(
+                'leave', user_id, 'jalali', jalali_year, jalali_month,
+                lambda: self.get_summary(user_id, jalali_year, jalali_month)
+            )
+            return json_response(response_data)
+        except ValidationError as e:
+            return error_response(e)
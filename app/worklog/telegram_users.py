@@ -0,0 +1,102 @@
+"""
+telegram_id -> user pk resolution for the Telegram endpoints.
+
+Two layers: a dict on the request, so one request resolves a telegram_id once, and a
+process-wide LRU so repeat requests from the same chat skip the users table entirely.
+The post_save/post_delete receivers on User in signals.py evict entries of this process;
+TELEGRAM_USER_CACHE_TTL bounds how long another process can serve a stale mapping.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from userauths.models import User
+
+_lock = threading.Lock()
+_user_ids = OrderedDict()  # telegram_id -> (pk, expires_at)
+_telegram_ids = {}         # pk -> telegram_id, for eviction by user
+
+
+def _cache_size():
+    return getattr(settings, 'TELEGRAM_USER_CACHE_SIZE', 4096)
+
+
+def _cache_ttl():
+    return getattr(settings, 'TELEGRAM_USER_CACHE_TTL', 300)
+
+
+def _cached_user_id(telegram_id):
+    with _lock:
+        entry = _user_ids.get(telegram_id)
+        if entry is None:
+            return None
+        user_id, expires_at = entry
+        if expires_at < time.monotonic():
+            del _user_ids[telegram_id]
+            _telegram_ids.pop(user_id, None)
+            return None
+        _user_ids.move_to_end(telegram_id)
+        return user_id
+
+
+def _remember_user_id(telegram_id, user_id):
+    size = _cache_size()
+    if size <= 0:
+        return
+    with _lock:
+        _user_ids[telegram_id] = (user_id, time.monotonic() + _cache_ttl())
+        _user_ids.move_to_end(telegram_id)
+        _telegram_ids[user_id] = telegram_id
+        while len(_user_ids) > size:
+            _, (evicted_id, _) = _user_ids.popitem(last=False)
+            _telegram_ids.pop(evicted_id, None)
+
+
+def _request_cache(request):
+    if request is None:
+        return {}
+    if not hasattr(request, '_telegram_user_ids'):
+        request._telegram_user_ids = {}
+    return request._telegram_user_ids
+
+
+def get_user_id(telegram_id, request=None):
+    """Return the pk of the user with this telegram_id; raises User.DoesNotExist."""
+    telegram_id = str(telegram_id)
+    resolved = _request_cache(request)
+    if telegram_id not in resolved:
+        user_id = _cached_user_id(telegram_id)
+        if user_id is None:
+            user_id = User.objects.values_list('pk', flat=True).get(telegram_id=telegram_id)
+            _remember_user_id(telegram_id, user_id)
+        resolved[telegram_id] = user_id
+    return resolved[telegram_id]
+
+
+async def aget_user_id(telegram_id, request=None):
+    """Async version of get_user_id."""
+    telegram_id = str(telegram_id)
+    resolved = _request_cache(request)
+    if telegram_id not in resolved:
+        user_id = _cached_user_id(telegram_id)
+        if user_id is None:
+            user_id = await User.objects.values_list('pk', flat=True).aget(telegram_id=telegram_id)
+            _remember_user_id(telegram_id, user_id)
+        resolved[telegram_id] = user_id
+    return resolved[telegram_id]
+
+
+def evict_user(user_id, telegram_id=None):
+    """Forget the mappings of this user, and of telegram_id whoever it pointed to."""
+    with _lock:
+        for key in {_telegram_ids.pop(user_id, None), telegram_id} - {None}:
+            entry = _user_ids.pop(key, None)
+            if entry is not None:
+                _telegram_ids.pop(entry[0], None)
+
+
+def clear():
+    with _lock:
+        _user_ids.clear()
+        _telegram_ids.clear()
@@ -11,11 +11,17 @@ from userauths.models import User
 from rest_framework.exceptions import ValidationError
 from django.core.exceptions import ObjectDoesNotExist
 
-from .models import Leave, WorkLog
+from .cache import get_or_set_summary
+from .calendar import month_datetime_range
+from .models import Leave, WorkLog, WorkSession
 from .serializers import (
                           LeaveSerializer,
                           WorkLogSerializer, TelegramWorkLogSerializer,
                           TelegramJalaliLeaveSerializer)
+from .leave_views import LeaveBatchCreateView
+from .leaves import leave_totals
+from .sessions import total_session_seconds
+from .telegram_users import get_user_id
 
 
 
@@ -29,18 +35,18 @@ class TelegramWorkLogView(viewsets.ModelViewSet):
         recorded_time = self.kwargs['recorded_time']
         return WorkLog.objects.filter(user__telegram_id=telegram_id)
 
-    def perform_create(self, serializer):
-        telegram_id = self.kwargs['telegram_id']
+    def get_user_id(self):
         try:
-            user = User.objects.get(telegram_id=telegram_id) 
-            serializer.save(user=user)
+            return get_user_id(self.kwargs['telegram_id'], self.request)
         except ObjectDoesNotExist as exc:
-            raise ValidationError({"error": f"User with telegram_id {telegram_id} does not exist."}) from exc
+            raise ValidationError({"non_field_errors": ["User with this telegram_id does not exist."]}) from exc
+
+    def perform_create(self, serializer):
+        serializer.save(user_id=self.get_user_id())
     
     def create(self, request, *args, **kwargs):
-        telegram_id = self.kwargs['telegram_id']
-        serializer = self.get_serializer(data=request.data, context={'telegram_id': telegram_id})
         try: 
+            serializer = self.get_serializer(data=request.data, context={'user_id': self.get_user_id()})
             serializer.is_valid(raise_exception=True)
             self.perform_create(serializer)
             headers = self.get_success_headers(serializer.data)
@@ -62,19 +68,19 @@ class TelegramLeaveView(viewsets.ModelViewSet):
             raise ValidationError({"error": f"No leaves found for telegram_id {telegram_id}."}) from exc
 
 
-    def perform_create(self, serializer):
-        telegram_id = self.kwargs['telegram_id']
+    def get_user_id(self):
         try:
-            user = User.objects.get(telegram_id=telegram_id)
-            serializer.save(user=user)
+            return get_user_id(self.kwargs['telegram_id'], self.request)
         except ObjectDoesNotExist as exc:
-            raise ValidationError({"error": f"User with telegram_id {telegram_id} does not exist."}) from exc
+            raise ValidationError({"non_field_errors": ["User with this telegram_id does not exist."]}) from exc
+
+    def perform_create(self, serializer):
+        serializer.save(user_id=self.get_user_id())
 
 
     def create(self, request, *args, **kwargs):
-        telegram_id = self.kwargs['telegram_id']
-        serializer = self.get_serializer(data=request.data, context={'telegram_id': telegram_id})
         try:
+            serializer = self.get_serializer(data=request.data, context={'user_id': self.get_user_id()})
             serializer.is_valid(raise_exception=True)
             self.perform_create(serializer)
             headers = self.get_success_headers(serializer.data)
@@ -83,59 +89,75 @@ class TelegramLeaveView(viewsets.ModelViewSet):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
 
+@method_decorator(csrf_exempt, name='dispatch')
+class TelegramLeaveBatchView(LeaveBatchCreateView):
+    permission_classes = [AllowAny]
+
+    def get_user_id(self):
+        telegram_id = self.kwargs['telegram_id']
+        try:
+            return get_user_id(telegram_id, self.request)
+        except ObjectDoesNotExist as exc:
+            raise ValidationError({"error": f"User with telegram_id {telegram_id} does not exist."}) from exc
+
+
 @method_decorator(csrf_exempt, name='dispatch') 
 class TelegramJalaliMonthlyWorkLogView(viewsets.ModelViewSet):
     serializer_class = WorkLogSerializer
     permission_classes = [AllowAny]
 
-    def get_queryset(self):
+    def get_user_id(self):
         telegram_id = self.kwargs['telegram_id']
+        try:
+            return get_user_id(telegram_id, self.request)
+        except ObjectDoesNotExist as exc:
+            raise ValidationError({"error": f"User with telegram_id {telegram_id} does not exist."}) from exc
+
+    def get_queryset(self):
         jalali_year = int(self.kwargs['jalali_year'])
         jalali_month = int(self.kwargs['jalali_month'])
         
         try:
-            start_date = JalaliDate(jalali_year, jalali_month, 1).to_gregorian()
-            end_date = JalaliDate(jalali_year, jalali_month + 1, 1).to_gregorian() - timedelta(seconds=1)
+            start_date, end_date = month_datetime_range(jalali_year, jalali_month)
             
-            user = User.objects.get(telegram_id=telegram_id)
             return WorkLog.objects.filter(
-                user=user,
+                user_id=self.user_id,
                 recorded_time__range=(start_date, end_date)
                 ).order_by('recorded_time')
-        except ObjectDoesNotExist as exc:
-            raise ValidationError({"error": f"User with telegram_id {telegram_id} does not exist."}) from exc
         except ValueError as exc:
             raise ValidationError({"error": "Invalid Jalali date."}) from exc
 
+    def get_summary(self):
+        queryset = self.get_queryset()
+        serializer = self.get_serializer(queryset, many=True)
+
+        total_seconds = total_session_seconds(WorkSession.objects.filter(
+            user_id=self.user_id,
+            jalali_year=int(self.kwargs['jalali_year']),
+            jalali_month_number=int(self.kwargs['jalali_month'])
+        ))
+
+        days, remainder = divmod(total_seconds, 86400)
+        hours, remainder = divmod(remainder, 3600)
+        minutes, _ = divmod(remainder, 60)
+
+        return {
+            'work_logs': serializer.data,
+            'total_hours': {
+                'days': int(days),
+                'hours': int(hours),
+                'minutes': int(minutes)
+            }
+        }
 
     def list(self, request, *args, **kwargs):
         try:
-            queryset = self.get_queryset()
-            serializer = self.get_serializer(queryset, many=True)
-
-            total_seconds = 0
-            current_start_time = None
-
-            for log in queryset:
-                if log.status == 'started':
-                    current_start_time = log.recorded_time
-                elif log.status == 'ended' and current_start_time:
-                    duration = log.recorded_time - current_start_time
-                    total_seconds += duration.total_seconds()
-                    current_start_time = None
-
-            days, remainder = divmod(total_seconds, 86400)
-            hours, remainder = divmod(remainder, 3600)
-            minutes, _ = divmod(remainder, 60)
-
-            response_data = {
-                'work_logs': serializer.data,
-                'total_hours': {
-                    'days': int(days),
-                    'hours': int(hours),
-                    'minutes': int(minutes)
-                }
-            }
+            self.user_id = self.get_user_id()
+            response_data = get_or_set_summary(
+                'worklog', self.user_id, 'jalali',
+                self.kwargs['jalali_year'], self.kwargs['jalali_month'],
+                self.get_summary
+            )
 
             return Response(response_data)
         except ValidationError as e:
@@ -148,46 +170,43 @@ class TelegramJalaliMonthlyLeaveView(viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     
     def get_queryset(self):
-        telegram_id = self.kwargs['telegram_id']
         jalali_year = int(self.kwargs['jalali_year'])
         jalali_month = int(self.kwargs['jalali_month'])
-        user = User.objects.get(telegram_id=telegram_id)
-        queryset = Leave.objects.filter(user=user)
-
-        filtered_queryset = []
-        for leave in queryset:
-            leave_jalali_date = JalaliDate.to_jalali(leave.leave_date)
-            if leave_jalali_date.year == jalali_year and leave_jalali_date.month == jalali_month:
-                filtered_queryset.append(leave)
-        
-        return filtered_queryset
+        return Leave.objects.filter(
+            user_id=self.user_id,
+            jalali_year=jalali_year,
+            jalali_month_number=jalali_month
+        ).order_by('leave_date', 'start_time')
 
-    def list(self, request, *args, **kwargs):  
+    def get_summary(self):
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
         
-        total_days = 0
-        total_hours = timedelta()
-        
-        for leave in queryset:
-            leave_jalali_date = JalaliDate.to_jalali(leave.leave_date)
-            
-            if leave_jalali_date.year == int(self.kwargs['jalali_year']) and leave_jalali_date.month == int(self.kwargs['jalali_month']):
-                if leave.start_time and leave.end_time:
-                    start_datetime = datetime.combine(leave.leave_date, leave.start_time)
-                    end_datetime = datetime.combine(leave.leave_date, leave.end_time)
-                    total_hours += (end_datetime - start_datetime)
-                else:
-                    total_days += 1
+        total_days, _, total_hours = leave_totals(queryset)
 
         total_hours_in_hours = total_hours.total_seconds() // 3600
         total_minutes_in_minutes = (total_hours.total_seconds() % 3600) // 60
 
-        return Response({
+        return {
             'leave_records': serializer.data,
             'total_days': total_days,
             'total_hours': int(total_hours_in_hours),
             'total_minutes': int(total_minutes_in_minutes),
             'jalali_year': self.kwargs['jalali_year'],
             'jalali_month': self.kwargs['jalali_month']
-        })
\ No newline at end of file
+        }
+
+    def list(self, request, *args, **kwargs):  
+        telegram_id = self.kwargs['telegram_id']
+        try:
+            self.user_id = get_user_id(telegram_id, request)
+        except ObjectDoesNotExist:
+            error = ValidationError({"error": f"User with telegram_id {telegram_id} does not exist."})
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_data = get_or_set_summary(
+            'leave', self.user_id, 'jalali',
+            self.kwargs['jalali_year'], self.kwargs['jalali_month'],
+            self.get_summary
+        )
+        return Response(response_data)
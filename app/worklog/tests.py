@@ -1,3 +1,824 @@
-from django.test import TestCase
+import json
+import zipfile
+from datetime import date, datetime, time, timedelta, timezone
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from persiantools.jdatetime import JalaliDate
+from userauths.models import User
+
+from api import urls as api_urls
+from api.metrics import registry
+from worklog.calendar import get_calendar, month_datetime_range, month_range, to_gregorian, to_jalali, year_range
+from worklog.exports import export_queryset, iter_xlsx_rows
+from worklog.leave_batches import expand_leave_dates
+from worklog.leaves import leave_interval, overlapping_leaves
+from worklog.models import DailyRollup, Leave, WorkLog, WorkLogState, WorkSession
+from worklog.reports import MONTHLY_TIMESHEET_SQL, monthly_timesheet
+from worklog.sessions import pair_work_sessions
+
+
+def make_user(name, **kwargs):
+    kwargs.setdefault('telegram_id', name)
+    return User.objects.create(username=name, email=f'{name}@example.com', **kwargs)
+
+
+class JalaliCalendarTests(SimpleTestCase):
+    """The lookup table must agree with persiantools, which wrote the values already stored."""
+
+    def test_every_day_of_the_span_matches_persiantools(self):
+        first_year, last_year = settings.JALALI_CALENDAR_YEARS
+        day, end = JalaliDate(first_year, 1, 1).to_gregorian(), JalaliDate(last_year + 1, 1, 1).to_gregorian()
+        esfand_30 = []
+        while day < end:
+            jalali = to_jalali(day)
+            self.assertEqual(to_gregorian(jalali.year, jalali.month, jalali.day), day)
+            try:
+                expected = JalaliDate(day)
+            except ValueError:
+                # persiantools converts this day to an Esfand 30 its own leap rule rejects; the table keeps it
+                self.assertEqual((jalali.month, jalali.day), (12, 30), day)
+                esfand_30.append(jalali.year)
+                day += timedelta(days=1)
+                continue
+
+            self.assertEqual((jalali.year, jalali.month, jalali.day), (expected.year, expected.month, expected.day))
+            self.assertEqual((jalali.weekday_name, jalali.month_name), (expected.strftime('%A'), expected.strftime('%B')))
+            if jalali.day == 30 and jalali.month == 12:
+                esfand_30.append(jalali.year)
+            if jalali.day == 1:
+                next_month = (jalali.year + 1, 1) if jalali.month == 12 else (jalali.year, jalali.month + 1)
+                self.assertEqual(month_range(jalali.year, jalali.month), (day, JalaliDate(*next_month, 1).to_gregorian()))
+                if jalali.month == 1:
+                    self.assertEqual(year_range(jalali.year), (day, JalaliDate(jalali.year + 1, 1, 1).to_gregorian()))
+            day += timedelta(days=1)
+
+        # The leap years, Esfand 30 included, and no others
+        self.assertIn(1403, esfand_30)
+        self.assertNotIn(1402, esfand_30)
+        for year in range(first_year, last_year + 1):
+            self.assertEqual(month_range(year, 12)[1] - month_range(year, 12)[0], timedelta(days=30 if year in esfand_30 else 29))
+
+    def test_outside_the_span(self):
+        calendar = get_calendar()
+        # Valid dates fall back to persiantools
+        self.assertNotIn(date(1900, 1, 1), calendar)
+        self.assertEqual(tuple(to_jalali(date(1900, 1, 1))[:3]), (1278, 10, 11))
+        self.assertEqual(to_gregorian(1200, 1, 1), JalaliDate(1200, 1, 1).to_gregorian())
+        # Dates that do not exist raise ValueError, in and out of the span
+        for args in ((99999, 1, 1), (0, 1, 1), (1403, 13, 1), (1403, 0, 1), (1403, 7, 31), (1402, 12, 30), (1200, 12, 31)):
+            with self.assertRaises(ValueError, msg=args):
+                to_gregorian(*args)
+        with self.assertRaises(ValueError):
+            year_range(99999)
+
+
+class MonthlyTimesheetTests(TestCase):
+    # 1403-01 (Farvardin) starts on 2024-03-20
+    jalali_year, jalali_month = 1403, 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user('alice', is_staff=True)
+        cls.bob = make_user('bob')
+        cls.carol = make_user('carol')
+
+        def at(day, hour, minute=0):
+            return datetime(2024, 3, 20, hour, minute, tzinfo=timezone.utc) + timedelta(days=day)
+
+        events = {
+            cls.alice: [
+                ('started', at(0, 9)), ('ended', at(0, 17, 30)),
+                ('started', at(1, 8)), ('ended', at(1, 12)),
+                ('started', at(1, 13)), ('ended', at(1, 18, 15)),
+            ],
+            # A started log that is never ended, a second start replacing the first
+            # one and an ended log without a start
+            cls.bob: [
+                ('ended', at(2, 7)),
+                ('started', at(2, 9)), ('started', at(2, 10)), ('ended', at(2, 16)),
+                ('ended', at(2, 17)),
+                ('started', at(3, 9)),
+            ],
+            # Only the session inside the month counts
+            cls.carol: [
+                ('started', at(-1, 9)), ('ended', at(-1, 17)),
+                ('started', at(31, 9)), ('ended', at(31, 11)),
+            ],
+        }
+        for user, user_events in events.items():
+            for status, recorded_time in user_events:
+                WorkLog.objects.create(user=user, status=status, recorded_time=recorded_time)
+
+        Leave.objects.create(user=cls.bob, leave_date=date(2024, 3, 25))
+        Leave.objects.create(user=cls.bob, leave_date=date(2024, 3, 26), start_time=time(9), end_time=time(11, 30))
+        Leave.objects.create(user=cls.carol, leave_date=date(2024, 3, 19))
+
+    def python_worked_seconds(self, user):
+        start, end = month_datetime_range(self.jalali_year, self.jalali_month)
+        logs = WorkLog.objects.filter(
+            user=user,
+            recorded_time__range=(start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc))
+        ).order_by('recorded_time')
+        sessions = pair_work_sessions(logs)
+        return sum(int((end - start).total_seconds()) for start, end in sessions), len(sessions)
+
+    def test_matches_python_pairing(self):
+        with self.assertNumQueries(1):
+            report = {row['user_id']: row for row in monthly_timesheet(self.jalali_year, self.jalali_month)}
+
+        for user in (self.alice, self.bob, self.carol):
+            worked_seconds, session_count = self.python_worked_seconds(user)
+            self.assertEqual(report[user.pk]['worked_seconds'], worked_seconds)
+            self.assertEqual(report[user.pk]['session_count'], session_count)
+
+        self.assertEqual(report[self.alice.pk]['worked_seconds'], int(8.5 * 3600 + 4 * 3600 + 5.25 * 3600))
+        self.assertEqual(report[self.bob.pk]['session_count'], 1)
+        self.assertEqual(report[self.carol.pk]['session_count'], 0)
+
+    def test_leaves(self):
+        report = {row['user_id']: row for row in monthly_timesheet(self.jalali_year, self.jalali_month)}
+
+        self.assertEqual(report[self.bob.pk]['full_day_leaves'], 1)
+        self.assertEqual(report[self.bob.pk]['hourly_leave_hours'], 2.5)
+        self.assertEqual(report[self.carol.pk]['full_day_leaves'], 0)
+
+    def test_endpoint_requires_staff(self):
+        url = reverse('monthly-timesheet', args=[self.jalali_year, self.jalali_month])
+
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.alice)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['users']), 3)
+
+    def test_yearly_heatmap(self):
+        team = Group.objects.create(name='team')
+        self.alice.groups.add(team)
+        self.bob.groups.add(team)
+        url = reverse('yearly-heatmap', args=[self.jalali_year])
+        self.client.force_login(self.alice)
+
+        heatmap = self.client.get(url, {'group': 'team'}).json()
+        self.assertEqual((heatmap['first_date'], heatmap['days'], heatmap['user_count']), ('2024-03-20', 366, 2))
+        self.assertEqual(heatmap['worked_minutes'][:3], [510, 555, 360])
+        self.assertEqual(heatmap['full_day_leaves'][5], 1)
+        self.assertEqual(heatmap['leave_minutes'][6], 150)
+
+        # Cached until a write touches the year
+        with self.assertNumQueries(3):
+            self.client.get(url, {'group': 'team'})
+        with self.captureOnCommitCallbacks(execute=True):
+            WorkLog.objects.create(user=self.bob, status='ended', recorded_time=datetime(2024, 3, 23, 17, tzinfo=timezone.utc))
+        heatmap = self.client.get(url, {'group': 'team'}).json()
+        self.assertEqual(heatmap['worked_minutes'][3], 480)
+
+        # Everyone else only gets their own year
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.get(url, {'group': 'team'}).json()['user_count'], 1)
+
+
+    def test_yearly_heatmap_rejects_years_without_a_calendar(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('yearly-heatmap', args=[99999]))
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaisesMessage(CommandError, "Invalid Jalali year 99999"):
+            call_command('rebuild_rollups', jalali_year=99999, stdout=StringIO())
+
+class AdminChangelistTests(TestCase):
+    urls = ('admin:worklog_worklog_changelist', 'admin:worklog_leave_changelist')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('admin', is_staff=True, is_superuser=True)
+
+    def add_rows(self, users, first_user=0):
+        for number in range(first_user, first_user + users):
+            user = make_user(f'user{number}')
+            for day in range(3):
+                moment = datetime(2024, 3, 20 + day, 9, tzinfo=timezone.utc)
+                WorkLog.objects.create(user=user, status='started', recorded_time=moment)
+                WorkLog.objects.create(user=user, status='ended', recorded_time=moment + timedelta(hours=8))
+                Leave.objects.create(user=user, leave_date=date(2024, 4, 1 + day), reason='trip')
+
+    def changelist_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.admin)
+        cases = [{}, {'jalali_year': '1403', 'jalali_month_number': '1'}, {'username': 'user1'}]
+
+        self.add_rows(3)
+        before = {(url, str(params)): self.changelist_queries(url, params) for url in self.urls for params in cases}
+        self.add_rows(20, first_user=3)
+        after = {(url, str(params)): self.changelist_queries(url, params) for url in self.urls for params in cases}
+
+        self.assertEqual(before, after)
+        self.assertLessEqual(max(after.values()), 8)
+
+
+class DerivedRowsTests(TestCase):
+    """WorkSession, WorkLogState and DailyRollup after each kind of change match a full rebuild."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user('alice')
+        cls.bob = make_user('bob')
+        start = datetime(2024, 3, 18, 9, tzinfo=timezone.utc)
+        for user in (cls.alice, cls.bob):
+            for day in range(4):
+                moment = start + timedelta(days=day)
+                WorkLog.objects.create(user=user, status='started', recorded_time=moment)
+                WorkLog.objects.create(user=user, status='ended', recorded_time=moment + timedelta(hours=8))
+
+    def derived_rows(self):
+        return (
+            list(WorkSession.objects.order_by('user_id', 'start').values_list(
+                'user_id', 'start', 'end', 'duration_seconds', 'jalali_month_number', 'jalali_day'
+            )),
+            list(WorkLogState.objects.order_by('user_id').values_list(
+                'user_id', 'last_status', 'last_recorded_time', 'open_session_start'
+            )),
+            list(DailyRollup.objects.order_by('user_id', 'date').values_list(
+                'user_id', 'date', 'worked_seconds', 'session_count'
+            )),
+        )
+
+    def assert_matches_rebuild(self):
+        incremental = self.derived_rows()
+        call_command('rebuild_work_sessions', stdout=StringIO())
+        call_command('rebuild_rollups', start=date(2024, 3, 1), end=date(2024, 4, 30), stdout=StringIO())
+        self.assertEqual(incremental, self.derived_rows())
+
+    def alice_logs(self):
+        return list(WorkLog.objects.filter(user=self.alice).order_by('recorded_time'))
+
+    def test_update(self):
+        # Across midnight into the next month's first day, then back before an earlier session
+        logs = self.alice_logs()
+        logs[3].recorded_time = datetime(2024, 3, 20, 1, tzinfo=timezone.utc)
+        logs[3].save()
+        logs[6].recorded_time = datetime(2024, 3, 17, 12, tzinfo=timezone.utc)
+        logs[6].save()
+        self.assert_matches_rebuild()
+
+    def test_delete(self):
+        logs = self.alice_logs()
+        logs[2].delete()
+        logs[-1].delete()
+        self.assertEqual(WorkLogState.objects.get(user=self.alice).open_session_start, logs[-2].recorded_time)
+        self.assert_matches_rebuild()
+
+    def test_queryset_delete(self):
+        WorkLog.objects.filter(user=self.alice, recorded_time__day__in=[19, 20], status='ended').delete()
+        self.assert_matches_rebuild()
+
+    def test_user_change(self):
+        for log in self.alice_logs()[2:4]:
+            log.user = self.bob
+            log.recorded_time -= timedelta(days=10)
+            log.save()
+        self.assert_matches_rebuild()
+
+    def test_time_zone_change(self):
+        # Already the next day in Tehran, though the log's stored fields stay the same
+        start = datetime(2024, 3, 25, 22, tzinfo=timezone.utc)
+        WorkLog.objects.create(user=self.alice, status='started', recorded_time=start)
+        WorkLog.objects.create(user=self.alice, status='ended', recorded_time=start + timedelta(hours=1))
+
+        with override_settings(TIME_ZONE='Asia/Tehran'):
+            call_command('recompute_date_fields', stdout=StringIO())
+            self.assertIn(date(2024, 3, 26), DailyRollup.objects.filter(user=self.alice).values_list('date', flat=True))
+            self.assert_matches_rebuild()
+
+    def test_recompute_twice_with_one_state_file(self):
+        with TemporaryDirectory() as directory:
+            state_file = Path(directory) / 'recompute.json'
+            for run in range(2):
+                WorkLog.objects.filter(user=self.alice).update(jalali_day=0)
+                output = StringIO()
+                call_command('recompute_date_fields', state_file=str(state_file), batch_size=3, stdout=output)
+
+                self.assertIn("Updated 8 of 16 WorkLog rows.", output.getvalue(), run)
+                self.assertFalse(WorkLog.objects.filter(jalali_day=0).exists())
+                self.assertEqual(json.loads(state_file.read_text()), {})
+
+    def test_monthly_views_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.alice)
+        urls = ['/worklog/monthly/2024/3/', '/worklog/jalali/monthly/1403/1/']
+
+        def queries():
+            cache.clear()
+            counts = []
+            for url in urls:
+                with CaptureQueriesContext(connection) as captured:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                counts.append(len(captured))
+            return counts
+
+        before = queries()
+        start = datetime(2024, 3, 25, 9, tzinfo=timezone.utc)
+        for day in range(10):
+            WorkLog.objects.create(user=self.alice, status='started', recorded_time=start + timedelta(days=day))
+            WorkLog.objects.create(user=self.alice, status='ended', recorded_time=start + timedelta(days=day, hours=8))
+        self.assertEqual(queries(), before)
+
+
+class WorkLogPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('pages')
+        start = datetime(2024, 3, 18, 9, tzinfo=timezone.utc)
+        for day in range(10):
+            WorkLog.objects.create(user=cls.user, status='started', recorded_time=start + timedelta(days=day))
+            WorkLog.objects.create(user=cls.user, status='ended', recorded_time=start + timedelta(days=day, hours=8))
+
+    def test_query_count_per_page(self):
+        self.client.force_login(self.user)
+        url = reverse('user-worklogs', args=[self.user.pk]) + '?page_size=8'
+        seen = []
+        while url:
+            # Session, user, the URL's user and the page itself, however many rows it holds
+            with self.assertNumQueries(4):
+                page = self.client.get(url).json()
+            seen += [log['id'] for log in page['results']]
+            url = page['next']
+
+        self.assertEqual(seen, list(WorkLog.objects.filter(user=self.user).order_by('recorded_time', 'id').values_list('id', flat=True)))
+
+
+class LeaveOverlapTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('overlap', telegram_id='201')
+        Leave.objects.create(user=cls.user, leave_date=date(2024, 3, 20))
+        Leave.objects.create(user=cls.user, leave_date=date(2024, 3, 22), start_time=time(10), end_time=time(11))
+        # Two days, through midnight into the 26th
+        Leave.objects.create(user=cls.user, leave_date=date(2024, 3, 24))
+        Leave.objects.create(user=cls.user, leave_date=date(2024, 3, 25))
+
+    def book(self, leave_date, start_time=None, end_time=None, end_date=None):
+        data = {'leave_date': leave_date, 'start_time': start_time, 'end_time': end_time}
+        if end_date:
+            data['end_date'] = end_date
+        response = self.client.post(
+            reverse('leave-telegram-create', args=[self.user.telegram_id]),
+            {key: value for key, value in data.items() if value}, content_type='application/json'
+        )
+        return response.status_code
+
+    def assert_overlap_rules(self):
+        cases = [
+            # Hourly over a full day, then on the free day after it
+            (('2024-03-20', '10:00', '11:00'), 400),
+            # Full day over hourly leave
+            (('2024-03-22',), 400),
+            (('2024-03-22', '10:30', '11:30'), 400),
+            # Back to back with the 10:00-11:00 leave
+            (('2024-03-22', '11:00', '12:00'), 201),
+            (('2024-03-22', '09:00', '10:00'), 201),
+            # The multi-day leave ends at midnight
+            (('2024-03-25', '23:00', '23:59'), 400),
+            (('2024-03-23', None, None, '2024-03-24'), 400),
+            (('2024-03-26', '00:00', '01:00'), 201),
+            (('2024-03-21',), 201),
+        ]
+        for args, expected in cases:
+            self.assertEqual(self.book(*args), expected, args)
+
+    def test_overlap_rules(self):
+        self.assert_overlap_rules()
+
+    def test_rows_without_intervals(self):
+        # Rows saved before starts_at/ends_at existed, until recompute_date_fields fills them
+        Leave.objects.update(starts_at=None, ends_at=None)
+        self.assert_overlap_rules()
+
+    async def test_end_date_null_or_absent(self):
+        url = reverse('leave-telegram-create', args=[self.user.telegram_id])
+        for leave_date, extra in (('2024-04-01', {'end_date': None}), ('2024-04-02', {})):
+            response = await AsyncClient().post(
+                url, {'leave_date': leave_date, **extra}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 201, extra)
+        self.assertEqual(await Leave.objects.filter(user=self.user, leave_date__month=4).acount(), 2)
+
+    def test_batch_sees_rows_without_intervals(self):
+        Leave.objects.update(starts_at=None, ends_at=None)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('leave-batch-create'), {
+            'start_date': '2024-03-19', 'end_date': '2024-03-23',
+            'start_time': '10:30', 'end_time': '12:00', 'skip_conflicts': True,
+        }, content_type='application/json')
+
+        self.assertEqual(
+            [result['leave_date'] for result in response.json()['results'] if result['error']],
+            ['2024-03-20', '2024-03-22']
+        )
+
+
+class LeaveBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('batch')
+        # Thursday
+        Leave.objects.create(user=cls.user, leave_date=date(2024, 3, 28))
+
+    def book(self, **batch):
+        self.client.force_login(self.user)
+        return self.client.post(reverse('leave-batch-create'), batch, content_type='application/json')
+
+    def test_recurrence_expansion(self):
+        self.assertEqual(
+            expand_leave_dates(date(2024, 3, 18), date(2024, 4, 14), ['thursday', 'monday'], every_weeks=2),
+            [date(2024, 3, 18), date(2024, 3, 21), date(2024, 4, 1), date(2024, 4, 4)]
+        )
+        self.assertEqual(len(expand_leave_dates(date(2024, 3, 18), date(2024, 3, 24))), 7)
+
+    def test_conflict_creates_nothing(self):
+        response = self.book(start_date='2024-03-25', end_date='2024-03-29')
+
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertEqual((body['requested'], body['created']), (5, 0))
+        self.assertEqual([result['leave_date'] for result in body['results'] if result['error']], ['2024-03-28'])
+        self.assertEqual(Leave.objects.filter(user=self.user).count(), 1)
+
+    def test_skip_conflicts(self):
+        response = self.book(start_date='2024-03-25', end_date='2024-03-29', skip_conflicts=True)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 4)
+        self.assertEqual(
+            list(Leave.objects.filter(user=self.user).order_by('leave_date').values_list('leave_date', flat=True)),
+            [date(2024, 3, 25), date(2024, 3, 26), date(2024, 3, 27), date(2024, 3, 28), date(2024, 3, 29)]
+        )
+        self.assertEqual(DailyRollup.objects.filter(user=self.user, full_day_leave=True).count(), 5)
+
+    def test_weekly_hourly_leaves(self):
+        response = self.book(
+            start_date='2024-03-18', end_date='2024-04-14', weekdays=['tuesday'],
+            start_time='13:00', end_time='17:00'
+        )
+
+        self.assertEqual(response.json()['created'], 4)
+        rollup = DailyRollup.objects.get(user=self.user, date=date(2024, 3, 19))
+        self.assertEqual((rollup.full_day_leave, rollup.leave_seconds), (False, 4 * 3600))
+
+
+class ClockEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('clock', telegram_id='55')
+
+    def clock(self, status, moment):
+        response = self.client.post(
+            reverse('worklog-telegram-create', args=[self.user.telegram_id]),
+            {'status': status, 'recorded_time': moment.isoformat()}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_clock_event_query_count(self):
+        day = datetime(2024, 3, 20, 9, tzinfo=timezone.utc)
+        # The first request also resolves the telegram_id and creates the state row
+        self.clock('started', day - timedelta(days=1))
+        self.clock('ended', day - timedelta(days=1, hours=-8))
+
+        # State read, insert (in a savepoint), state lock and update
+        with self.assertNumQueries(6):
+            self.clock('started', day)
+        # ... plus the session and the day's rollup (an UPDATE, then an INSERT for a new day)
+        with self.assertNumQueries(9):
+            self.clock('ended', day + timedelta(hours=8))
+
+        self.assertEqual(list(WorkSession.objects.filter(user=self.user).values_list('start', 'duration_seconds')), [
+            (day - timedelta(days=1), 8 * 3600), (day, 8 * 3600),
+        ])
+        rollup = DailyRollup.objects.get(user=self.user, date=day.date())
+        self.assertEqual((rollup.worked_seconds, rollup.session_count), (8 * 3600, 1))
+        state = WorkLogState.objects.get(user=self.user)
+        self.assertEqual((state.last_status, state.open_session_start), ('ended', None))
+
+
+    def test_monthly_worklogs_do_not_join_users(self):
+        self.clock('started', datetime(2024, 3, 20, 9, tzinfo=timezone.utc))
+        url = reverse('jalali-monthly-worklog', args=[self.user.telegram_id, 1403, 1])
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.json()['work_logs'][0]['user_id'], self.user.pk)
+        worklog_queries = [query['sql'] for query in captured if 'FROM "worklog_worklog"' in query['sql']]
+        self.assertTrue(worklog_queries)
+        self.assertFalse([sql for sql in worklog_queries if 'JOIN' in sql])
+
+class BulkIngestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('ingest-admin', is_staff=True)
+        cls.bulk_user = make_user('bulk', telegram_id='101')
+        cls.single_user = make_user('single', telegram_id='102')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def ingest(self, events, query=''):
+        return self.client.post(reverse('worklog-bulk-create') + query, events, content_type='application/json')
+
+    def test_batch_size_must_be_positive(self):
+        for batch_size in ('0', '-3', 'many'):
+            response = self.ingest([], f'?batch_size={batch_size}')
+            self.assertEqual(response.status_code, 400, batch_size)
+
+    def bulk_accepted(self, events):
+        response = self.ingest([
+            {'telegram_id': self.bulk_user.telegram_id, 'status': status, 'recorded_time': moment.isoformat()}
+            for status, moment in events
+        ])
+        rejected = {error['index'] for error in response.json()['errors']}
+        return [index not in rejected for index in range(len(events))]
+
+    def single_accepted(self, events):
+        accepted = []
+        for status, moment in events:
+            response = self.client.post(
+                reverse('worklog-telegram-create', args=[self.single_user.telegram_id]),
+                {'status': status, 'recorded_time': moment.isoformat()}, content_type='application/json'
+            )
+            accepted.append(response.status_code == 201)
+        return accepted
+
+    def test_same_sequence_rules_as_single_events(self):
+        start = datetime(2024, 3, 20, 9, tzinfo=timezone.utc)
+        # Clock out and back in at the same second, then a second 'ended' on top of that start
+        events = [
+            ('started', start), ('ended', start + timedelta(hours=4)),
+            ('started', start + timedelta(hours=4)), ('ended', start + timedelta(hours=4)),
+        ]
+
+        bulk_accepted = self.bulk_accepted(events)
+        self.assertEqual(bulk_accepted, [True, True, True, False])
+        self.assertEqual(self.single_accepted(events), bulk_accepted)
+        self.assertEqual(WorkLogState.objects.get(user=self.bulk_user).open_session_start, start + timedelta(hours=4))
+
+    def test_back_dated_events(self):
+        def at(day, hour):
+            return datetime(2024, 3, day, hour, tzinfo=timezone.utc)
+
+        for user in (self.bulk_user, self.single_user):
+            for status, moment in (('started', at(20, 9)), ('ended', at(20, 17)), ('started', at(22, 9))):
+                WorkLog.objects.create(user=user, status=status, recorded_time=moment)
+        # Historical data before and between the existing logs, plus the usual clock-out
+        events = [
+            ('started', at(18, 9)), ('ended', at(18, 17)),
+            ('ended', at(19, 8)),
+            ('started', at(20, 9)), ('started', at(20, 12)), ('started', at(20, 18)),
+            ('ended', at(21, 9)), ('ended', at(21, 10)),
+            ('ended', at(22, 18)),
+        ]
+
+        bulk_accepted = self.bulk_accepted(events)
+        self.assertEqual(bulk_accepted, [True, True, False, False, False, True, False, False, True])
+        self.assertEqual(self.single_accepted(events), bulk_accepted)
+
+        def derived_rows(user):
+            return (
+                list(WorkSession.objects.filter(user=user).order_by('start').values_list('start', 'end')),
+                list(WorkLogState.objects.filter(user=user).values_list('last_status', 'last_recorded_time')),
+                list(DailyRollup.objects.filter(user=user).order_by('date').values_list('date', 'worked_seconds')),
+            )
+
+        ingested = derived_rows(self.bulk_user)
+        self.assertEqual(ingested[0][0], (at(18, 9), at(18, 17)))
+        call_command('rebuild_work_sessions', stdout=StringIO())
+        call_command('rebuild_rollups', start=date(2024, 3, 1), end=date(2024, 3, 31), stdout=StringIO())
+        self.assertEqual(derived_rows(self.bulk_user), ingested)
+        self.assertEqual(derived_rows(self.single_user)[0], ingested[0])
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('export-admin', is_staff=True)
+        cls.user = make_user('exported')
+        WorkLog.objects.create(user=cls.user, status='started', recorded_time=datetime(2024, 3, 20, 9, tzinfo=timezone.utc))
+        WorkLog.objects.create(user=cls.admin, status='started', recorded_time=datetime(2024, 3, 20, 9, tzinfo=timezone.utc))
+
+    def export(self, query):
+        response = self.client.get(reverse('export', args=['worklogs']), query)
+        return response, b''.join(response.streaming_content) if response.streaming else None
+
+    def sheet_rows(self, workbook):
+        with zipfile.ZipFile(BytesIO(workbook)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        return [
+            [cell.findtext('s:v', namespaces=namespace) or cell.findtext('s:is/s:t', namespaces=namespace)
+             for cell in row]
+            for row in sheet.iterfind('s:sheetData/s:row', namespace)
+        ]
+
+    def test_staff_export_one_user(self):
+        self.client.force_login(self.admin)
+        response, body = self.export({'user': self.user.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body.decode().splitlines()), 2)
+
+    def test_invalid_user_is_a_bad_request(self):
+        self.client.force_login(self.admin)
+        response, _ = self.export({'user': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_xlsx_export(self):
+        self.client.force_login(self.admin)
+        WorkLog.objects.create(
+            user=self.user, status='ended', recorded_time=datetime(2024, 3, 20, 17, tzinfo=timezone.utc),
+            comment='<late> & \x01done'
+        )
+        response, body = self.export({'user': self.user.pk, 'file_format': 'xlsx'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="worklogs.xlsx"')
+        rows = self.sheet_rows(body)
+        self.assertEqual(rows[0][:4], ['id', 'user_id', 'user_username', 'status'])
+        self.assertEqual([row[1:4] for row in rows[1:]], [
+            [str(self.user.pk), 'exported', 'started'], [str(self.user.pk), 'exported', 'ended'],
+        ])
+        self.assertEqual(rows[2][-1], '<late> & done')
+        self.assertEqual(self.export({'file_format': 'ods'})[0].status_code, 400)
+
+    def test_xlsx_is_streamed_in_chunks(self):
+        queryset = export_queryset('worklogs')
+        chunks = [chunk for chunk in iter_xlsx_rows('worklogs', queryset, chunk_size=1) if chunk]
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(len(self.sheet_rows(b''.join(chunks))), 3)
+
+    def test_export_command_writes_xlsx(self):
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / 'leaves.xlsx'
+            Leave.objects.create(user=self.user, leave_date=date(2024, 3, 21))
+            call_command('export_records', 'leaves', file_format='xlsx', output=str(path))
+            rows = self.sheet_rows(path.read_bytes())
+        self.assertEqual(rows[1][3:5], ['2024-03-21', '1403-01-02'])
+
+
+class SummaryCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('cached', telegram_id='77')
+
+    def setUp(self):
+        cache.clear()
+
+    def month_summary(self, jalali_month):
+        response = self.client.get(reverse('jalali-monthly-worklog', args=[self.user.telegram_id, 1403, jalali_month]))
+        summary = response.json()
+        return len(summary['work_logs']), summary['total_hours']['hours']
+
+    def test_moving_a_log_evicts_both_months(self):
+        # 1403-02-06, in Ordibehesht
+        start = datetime(2024, 4, 25, 9, tzinfo=timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True):
+            logs = [
+                WorkLog.objects.create(user=self.user, status='started', recorded_time=start),
+                WorkLog.objects.create(user=self.user, status='ended', recorded_time=start + timedelta(hours=8)),
+            ]
+        self.assertEqual((self.month_summary(1), self.month_summary(2)), ((0, 0), (2, 8)))
+
+        # Back a month to 1403-01-06, then forward again
+        for days in (-31, 31):
+            with self.captureOnCommitCallbacks(execute=True):
+                for log in logs:
+                    log.recorded_time += timedelta(days=days)
+                    log.save()
+            moved = ((2, 8), (0, 0)) if days < 0 else ((0, 0), (2, 8))
+            self.assertEqual((self.month_summary(1), self.month_summary(2)), moved)
+
+    def test_rebuild_clears_cached_summaries(self):
+        self.assertEqual(self.month_summary(1), (0, 0))
+        # Imported without signals, as a bulk backfill does
+        start = datetime(2024, 3, 25, 9, tzinfo=timezone.utc)
+        logs = [
+            WorkLog(user=self.user, status='started', recorded_time=start),
+            WorkLog(user=self.user, status='ended', recorded_time=start + timedelta(hours=8)),
+        ]
+        for log in logs:
+            log.set_date_fields()
+        WorkLog.objects.bulk_create(logs)
+
+        call_command('rebuild_work_sessions', stdout=StringIO())
+        self.assertEqual(self.month_summary(1), (2, 8))
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('metrics', telegram_id='4242')
+        WorkLog.objects.create(user=cls.user, status='started', recorded_time=datetime(2024, 3, 20, 9, tzinfo=timezone.utc))
+
+    def queries_of(self, view):
+        prefix = f'worklog_db_queries_total{{view="{view}"}} '
+        line = next(line for line in registry.render().splitlines() if line.startswith(prefix))
+        return int(line[len(prefix):])
+
+    async def test_async_requests_count_their_queries(self):
+        registry.reset()
+        url = reverse('jalali-monthly-worklog', args=[self.user.telegram_id, 1403, 1])
+        response = await AsyncClient().get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.queries_of('jalali-monthly-worklog'), 0)
+
+
+    def test_every_view_has_its_own_label(self):
+        # Metrics are labelled by URL name, so two routes with one name would share a series
+        names = [pattern.name for pattern in api_urls.urlpatterns if getattr(pattern, 'name', None)]
+        self.assertEqual(sorted(names), sorted(set(names)))
+
+        self.client.force_login(self.user)
+        registry.reset()
+        self.client.get('/worklog/monthly/2024/3/')
+        after_gregorian = self.queries_of('gregorian-monthly-worklog')
+        self.client.get('/worklog/jalali/monthly/1403/1/')
+        self.assertGreater(after_gregorian, 0)
+        self.assertEqual(self.queries_of('gregorian-monthly-worklog'), after_gregorian)
+        self.assertGreater(self.queries_of('monthly-worklog'), 0)
+
+class QueryPlanTests(TestCase):
+    """The hot query shapes must be answered from an index, never by scanning a table."""
+
+    tables = (WorkLog._meta.db_table, Leave._meta.db_table, WorkSession._meta.db_table,
+              WorkLogState._meta.db_table, DailyRollup._meta.db_table, User._meta.db_table)
+
+    def assert_no_full_scan(self, sql, params=(), allowed=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        for step in plan:
+            words = step.split()
+            if words[0] == 'SCAN' and words[1] in self.tables and words[1] not in allowed:
+                self.fail(f"Full scan of {words[1]}:\n" + "\n".join(plan))
+
+    def assert_queryset_uses_index(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        self.assert_no_full_scan(sql, params)
+
+    def test_worklog_queries(self):
+        start, end = (moment.replace(tzinfo=timezone.utc) for moment in month_datetime_range(1403, 1))
+        self.assert_queryset_uses_index(WorkLog.objects.filter(user_id=1, recorded_time__range=(start, end)).order_by('recorded_time'))
+        self.assert_queryset_uses_index(WorkLog.objects.filter(user_id=1).order_by('recorded_time', 'id'))
+        self.assert_queryset_uses_index(WorkLog.objects.filter(user_id=1, recorded_time__lt=end).order_by('-recorded_time', '-id'))
+        self.assert_queryset_uses_index(WorkLog.objects.filter(user_id=1, jalali_year=1403, jalali_month_number=1))
+        self.assert_queryset_uses_index(WorkLog.objects.filter(user__telegram_id='1'))
+
+    def test_session_queries(self):
+        self.assert_queryset_uses_index(WorkSession.objects.filter(user_id=1, jalali_year=1403, jalali_month_number=1))
+        self.assert_queryset_uses_index(WorkSession.objects.filter(user_id=1, start__gte=datetime(2024, 3, 20, tzinfo=timezone.utc)))
+
+    def test_presence_query(self):
+        self.assert_queryset_uses_index(
+            WorkLogState.objects.filter(open_session_start__isnull=False).order_by('open_session_start')
+        )
+
+    def test_leave_queries(self):
+        self.assert_queryset_uses_index(Leave.objects.filter(user_id=1, leave_date=date(2024, 3, 20)))
+        self.assert_queryset_uses_index(Leave.objects.filter(user_id=1).order_by('leave_date', 'id'))
+        self.assert_queryset_uses_index(Leave.objects.filter(user_id=1, jalali_year=1403, jalali_month_number=1))
+        self.assert_queryset_uses_index(Leave.objects.filter(jalali_year=1403))
+        starts_at, ends_at = leave_interval(date(2024, 3, 20), last_date=date(2024, 4, 2))
+        self.assert_queryset_uses_index(overlapping_leaves(Leave.objects.filter(user_id=1), starts_at, ends_at))
+
+    def test_export_queries(self):
+        for kind in ('worklogs', 'sessions', 'leaves'):
+            self.assert_queryset_uses_index(export_queryset(kind, date(2024, 3, 20), date(2024, 4, 19)))
+
+    def test_monthly_timesheet(self):
+        sql = MONTHLY_TIMESHEET_SQL.format(rollup=DailyRollup._meta.db_table, user=User._meta.db_table)
+        sql = sql.replace('%(year)s', '1403').replace('%(month)s', '1')
+        # The report lists every user, so only the user table may be scanned
+        self.assert_no_full_scan(sql, allowed=(User._meta.db_table,))
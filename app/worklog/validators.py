@@ -1,59 +1,107 @@
 # validators.py
+from asgiref.sync import sync_to_async
 from rest_framework import serializers
-from .models import Leave, User, WorkLog
+from .leaves import MAX_LEAVE_DAYS, leave_interval, overlapping_leaves
+from .models import Leave, WorkLog, WorkLogState
 from django.utils.timezone import localtime, make_aware, is_naive
 
 
-def validate_leave_overlap(telegram_id, leave_date, start_time, end_time):
+def validate_leave_overlap(user_id, leave_date, start_time, end_time, last_date=None):
     """
-    Validator function to check for overlapping leave times based on telegram_id.
-    This function handles full-day leaves, hourly leaves, and checks if a full-day leave exists.
+    Validator function to check for overlapping leave times of an already resolved user.
+    Full-day, hourly and multi-day (through `last_date`) leaves are all checked as one
+    half-open interval against the user's leaves with a single indexed query.
     """
-    # Fetch the user based on telegram_id
-    try:
-        user = User.objects.get(telegram_id=telegram_id)
-    except User.DoesNotExist:
-        raise serializers.ValidationError("User with this telegram_id does not exist.")
-
-    # Fetch existing leaves for the same user on the same date
-    existing_leaves = Leave.objects.filter(user=user, leave_date=leave_date)
+    starts_at, ends_at = leave_request_interval(leave_date, start_time, end_time, last_date)
+    check_leave_overlap(
+        overlapping_leaves(Leave.objects.filter(user_id=user_id), starts_at, ends_at).first(),
+        start_time, end_time
+    )
+
+
+async def avalidate_leave_overlap(user_id, leave_date, start_time, end_time, last_date=None):
+    """Async version of validate_leave_overlap for the ASGI Telegram views."""
+    starts_at, ends_at = leave_request_interval(leave_date, start_time, end_time, last_date)
+    check_leave_overlap(
+        await overlapping_leaves(Leave.objects.filter(user_id=user_id), starts_at, ends_at).afirst(),
+        start_time, end_time
+    )
+
+
+def leave_request_interval(leave_date, start_time, end_time, last_date):
+    if (start_time is None) != (end_time is None):
+        raise serializers.ValidationError("Hourly leaves need both a start_time and an end_time.")
+    if start_time is not None:
+        if last_date is not None and last_date != leave_date:
+            raise serializers.ValidationError("Hourly leaves cannot span several days.")
+        if end_time <= start_time:
+            raise serializers.ValidationError("end_time must be after start_time.")
+    if last_date is not None and last_date < leave_date:
+        raise serializers.ValidationError("end_date cannot be before leave_date.")
+    if last_date is not None and (last_date - leave_date).days >= MAX_LEAVE_DAYS:
+        raise serializers.ValidationError(f"A leave cannot span more than {MAX_LEAVE_DAYS} days.")
+    return leave_interval(leave_date, start_time, end_time, last_date)
+
+
+def check_leave_overlap(conflict, start_time, end_time):
+    """Raise the validate_leave_overlap error for the first overlapping leave, if any."""
+    if conflict is None:
+        return
 
     # Case 1: Full-Day Leave (start_time and end_time are empty)
     if start_time is None and end_time is None:
-        # Check if there are any existing hourly leaves on the same date
-        if existing_leaves.exists():
-            raise serializers.ValidationError(
-                "Cannot add a full-day leave because there are existing leave hours on this day."
-            )
-
-    # Case 2: Hourly Leave (start_time and end_time are provided)
-    else:
-        for leave in existing_leaves:
-            # Case 3: Full-Day Leave exists (check if existing leave has no start_time and end_time)
-            if leave.start_time is None and leave.end_time is None:
-                raise serializers.ValidationError(
-                    "Cannot add hourly leaves because there is already a full-day leave on this day."
-                )
-
-            # Skip entries with missing start or end times for hourly leave comparison
-            if leave.start_time is None or leave.end_time is None:
-                continue
-
-            # Compare times only if both are present
-            if leave.start_time <= end_time and start_time <= leave.end_time:
-                raise serializers.ValidationError(
-                    f"Leave overlaps with an existing leave entry "
-                    f"from {leave.start_time.strftime('%H:%M')} to {leave.end_time.strftime('%H:%M')}."
-                )
-                
-
-def validate_worklog(telegram_id, status, recorded_time):
+        raise serializers.ValidationError(
+            f"Cannot add a full-day leave because there are existing leave hours on {conflict.leave_date}."
+        )
+
+    # Case 2: Hourly Leave over an existing full-day leave
+    if conflict.start_time is None or conflict.end_time is None:
+        raise serializers.ValidationError(
+            "Cannot add hourly leaves because there is already a full-day leave on this day."
+        )
+
+    # Case 3: Hourly Leave over existing leave hours
+    raise serializers.ValidationError(
+        f"Leave overlaps with an existing leave entry "
+        f"from {conflict.start_time.strftime('%H:%M')} to {conflict.end_time.strftime('%H:%M')}."
+    )
+
+
+def check_worklog_sequence(status, recorded_time, last_status, last_recorded_time):
+    """
+    Apply the validate_worklog rules to an event.
+    `last_status`/`last_recorded_time` describe the user's log right before it, at the
+    same time or earlier (None if there is none): the latest log for the usual clock event,
+    an earlier one for a back-dated event. An event at the same time as that log is
+    accepted only as a 'started' right after an 'ended'.
+    """
+    if last_status == 'started' and recorded_time == last_recorded_time:
+        raise serializers.ValidationError(f"Work log overlaps with an existing log recorded at {last_recorded_time}.")
+    if last_status == 'started' and status == 'started':
+        raise serializers.ValidationError(f"You have a started work at {last_recorded_time} , You must end that first")
+    if last_status == 'ended' and status == 'ended':
+        raise serializers.ValidationError("You must start a work session before ending it.")
+
+    # Validation: First entry of each day must be "started"
+    day_start = localtime(recorded_time).replace(hour=0, minute=0, second=0, microsecond=0)
+    if status != 'started' and (last_recorded_time is None or last_recorded_time < day_start):
+        raise serializers.ValidationError("The first record of the day must be 'started'.")
+
+
+def previous_worklog(user_id, recorded_time):
+    """
+    The (status, recorded_time) of the user's log right before `recorded_time`, at that
+    time or earlier, or (None, None).
+    """
+    return WorkLog.objects.filter(
+        user_id=user_id, recorded_time__lte=recorded_time
+    ).order_by('-recorded_time', '-id').values_list('status', 'recorded_time').first() or (None, None)
+
+
+def validate_worklog(user_id, status, recorded_time):
     
-        # Fetch the user based on telegram_id
-    try:
-        user = User.objects.get(telegram_id=telegram_id)
-    except User.DoesNotExist:
-        raise serializers.ValidationError("User with this telegram_id does not exist.")
+    # Fetch the user's latest clock event (the user itself is resolved by the caller)
+    state = WorkLogState.objects.filter(pk=user_id).first()
         
     # Ensure the recorded_time is aware (convert naive datetime to aware if necessary)
     if is_naive(recorded_time):
@@ -62,45 +110,28 @@ def validate_worklog(telegram_id, status, recorded_time):
     # Convert the recorded time to the user's local timezone
     recorded_time = localtime(recorded_time)
 
-    # Get the day start and end (for filtering work logs on the same day)
-    day_start = recorded_time.replace(hour=0, minute=0, second=0, microsecond=0)
-    day_end = recorded_time.replace(hour=23, minute=59, second=59, microsecond=999999)
-
-    # Check for overlapping work logs on the same day
-    overlapping_logs = WorkLog.objects.filter(
-        user=user,
-        recorded_time__range=(day_start, day_end)
-    ).exclude(status='ended')  # Ignore 'ended' logs as they are completed
-
-    for log in overlapping_logs:
-        log_start_time = log.recorded_time
-        log_end_time = log_start_time  # If 'started', it's ongoing
+    # Events from the latest log on (the usual clock-in/clock-out) only need the state row
+    if state and (state.last_recorded_time is None or recorded_time >= state.last_recorded_time):
+        check_worklog_sequence(status, recorded_time, state.last_status, state.last_recorded_time)
+        return
 
-        # If it's an 'ended' log, we consider the recorded time as the end of the work period
-        if log.status == 'ended':
-            log_end_time = log_start_time  # Adjust accordingly for ended logs
+    # Back-dated events (or users without a state row yet) must follow the log before them
+    check_worklog_sequence(status, recorded_time, *previous_worklog(user_id, recorded_time))
 
-        # Check for overlap with existing logs
-        if log_start_time <= recorded_time <= log_end_time:
-            raise serializers.ValidationError(f"Work log overlaps with an existing log recorded at {log.recorded_time}.")
 
-    # Get the last work log entry for this user (for sequence validation)
-    last_log = WorkLog.objects.filter(user=user).last()
-
-    # Validation: "started" must follow an "ended" session
-    if last_log:
-        if status == 'started' and last_log.status == 'started':
-            raise serializers.ValidationError(f"You have a started work at {last_log.recorded_time} , You must end that first")
-        if status == 'ended' and last_log.status == 'ended':
-            raise serializers.ValidationError("You must start a work session before ending it.")
+async def avalidate_worklog(user_id, status, recorded_time):
+    """
+    Async version of validate_worklog for the ASGI Telegram views.
+    Clock events newer than the latest log are checked against the state row with the
+    async ORM; back-dated ones fall back to the history queries in a worker thread.
+    """
+    if is_naive(recorded_time):
+        recorded_time = make_aware(recorded_time)
+    recorded_time = localtime(recorded_time)
 
-    # Validation: First entry of each day must be "started"
-    first_log_today = WorkLog.objects.filter(
-        user=user,
-        recorded_time__range=(day_start, day_end)
-    ).order_by('recorded_time').first()
+    state = await WorkLogState.objects.filter(pk=user_id).afirst()
+    if state and (state.last_recorded_time is None or recorded_time >= state.last_recorded_time):
+        check_worklog_sequence(status, recorded_time, state.last_status, state.last_recorded_time)
+        return
 
-    if not first_log_today and status != 'started':
-        raise serializers.ValidationError("The first record of the day must be 'started'.")
-    elif first_log_today and recorded_time == first_log_today.recorded_time and status != 'started':
-        raise serializers.ValidationError("The first record of the day must be 'started'.")
+    await sync_to_async(validate_worklog)(user_id, status, recorded_time)
@@ -12,7 +12,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.generic.edit import CreateView
 from persiantools.jdatetime import JalaliDate
 from rest_framework import generics, status, viewsets
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from userauths.models import User
@@ -21,12 +21,17 @@ from django.core.exceptions import ObjectDoesNotExist, ValidationError as Django
 from rest_framework.exceptions import ValidationError, NotFound, PermissionDenied
 
 
+from .cache import get_or_set_summary
+from .calendar import month_datetime_range
 from .forms import WorkLogForm
-from .models import Leave, WorkLog
+from .ingest import ingest_worklogs, parse_events
+from .pagination import WorkLogCursorPagination
+from .models import Leave, WorkLog, WorkSession
 from .serializers import (HourlyLeaveSerializer, JalaliLeaveSerializer,
                           LeaveSerializer, WorkLogDaySerializer,
                           WorkLogSerializer, TelegramWorkLogSerializer,
                           TelegramLeaveSerializer, TelegramJalaliLeaveSerializer)
+from .sessions import total_session_seconds
 
 
 
@@ -75,6 +80,7 @@ class WorkLogCreateView(LoginRequiredMixin, CreateView):
 class WorkLogViewSet(viewsets.ModelViewSet):
     serializer_class = WorkLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WorkLogCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -114,8 +120,7 @@ class WorkLogJalaliMonthlyView(generics.ListAPIView):
         user = self.request.user
         jalali_year = self.kwargs['jalali_year']
         jalali_month = self.kwargs['jalali_month']
-        start_date = JalaliDate(jalali_year, jalali_month, 1).to_gregorian()
-        end_date = JalaliDate(jalali_year, jalali_month + 1, 1).to_gregorian() - timedelta(seconds=1)
+        start_date, end_date = month_datetime_range(jalali_year, jalali_month)
         
         return WorkLog.objects.filter(
             user=user,
@@ -124,25 +129,29 @@ class WorkLogJalaliMonthlyView(generics.ListAPIView):
 
 
     def list(self, request, *args, **kwargs):
+        # Same payload as the Telegram monthly view, so both share the cached summary
+        response_data = get_or_set_summary(
+            'worklog', request.user.pk, 'jalali',
+            self.kwargs['jalali_year'], self.kwargs['jalali_month'],
+            self.get_summary
+        )
+        return Response(response_data)
+
+    def get_summary(self):
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
 
-        total_seconds = 0
-        current_start_time = None
-
-        for log in queryset:
-            if log.status == 'started':
-                current_start_time = log.recorded_time
-            elif log.status == 'ended' and current_start_time:
-                duration = log.recorded_time - current_start_time
-                total_seconds += duration.total_seconds()
-                current_start_time = None
+        total_seconds = total_session_seconds(WorkSession.objects.filter(
+            user=self.request.user,
+            jalali_year=self.kwargs['jalali_year'],
+            jalali_month_number=self.kwargs['jalali_month']
+        ))
 
         days, remainder = divmod(total_seconds, 86400)
         hours, remainder = divmod(remainder, 3600)
         minutes, _ = divmod(remainder, 60)
 
-        response_data = {
+        return {
             'work_logs': serializer.data,
             'total_hours': {
                 'days': int(days),
@@ -151,12 +160,11 @@ class WorkLogJalaliMonthlyView(generics.ListAPIView):
             }
         }
 
-        return Response(response_data)
-
 
 class UserWorkLogListView(viewsets.ModelViewSet):
     serializer_class = WorkLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WorkLogCursorPagination
 
     def get_queryset(self):
         user_pk = self.kwargs['user_pk']
@@ -171,23 +179,10 @@ class WorkLogDayView(APIView):
     def get(self, request, user_id, month, day):
         user = get_object_or_404(User, id=user_id)
         day_start = datetime.strptime(f'{day} {month}', '%d %B').replace(year=datetime.now().year)
-        work_logs = WorkLog.objects.filter(
+        total_seconds = total_session_seconds(WorkSession.objects.filter(
             user=user,
-            recorded_time__date=day_start.date()
-        ).order_by('recorded_time')
-
-        total_time = timedelta(0)
-        start_time = None
-
-        for log in work_logs:
-            if log.status == 'started':
-                start_time = localtime(log.recorded_time)
-            elif log.status == 'ended' and start_time:
-                end_time = localtime(log.recorded_time)
-                total_time += end_time - start_time
-                start_time = None
-
-        total_seconds = int(total_time.total_seconds())
+            start__date=day_start.date()
+        ))
         hours, remainder = divmod(total_seconds, 3600)
         minutes, _ = divmod(remainder, 60)
         total_time_str = f"{hours} hour{'s' if hours != 1 else ''}, {minutes} minute{'s' if minutes != 1 else ''}"
@@ -212,24 +207,26 @@ class MonthlyWorkLogView(generics.ListAPIView):
         ).order_by('recorded_time')
 
     def list(self, request, *args, **kwargs):
+        response_data = get_or_set_summary(
+            'worklog', request.user.pk, 'gregorian',
+            self.kwargs['year'], self.kwargs['month'],
+            self.get_summary
+        )
+        return Response(response_data)
+
+    def get_summary(self):
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
 
-        total_work_duration = timedelta()
-        current_start_time = None
-        
-        for log in queryset:
-            if log.status == 'started':
-                current_start_time = log.recorded_time
-            elif log.status == 'ended' and current_start_time:
-                total_work_duration += log.recorded_time - current_start_time
-                current_start_time = None
-
-        total_seconds = int(total_work_duration.total_seconds())
+        total_seconds = total_session_seconds(WorkSession.objects.filter(
+            user=self.request.user,
+            start__year=self.kwargs['year'],
+            start__month=self.kwargs['month']
+        ))
         hours, remainder = divmod(total_seconds, 3600)
         minutes, seconds = divmod(remainder, 60)
 
-        response_data = {
+        return {
             'total_work_time': {
                 'hours': hours,
                 'minutes': minutes,
@@ -237,4 +234,38 @@ class MonthlyWorkLogView(generics.ListAPIView):
             },
             'work_logs': serializer.data
         }
-        return Response(response_data)
+
+
+class WorkLogBulkCreateView(APIView):
+    """
+    Import clock events for many users from a JSON array or a JSON-lines body.
+    Each event is {"telegram_id", "status", "recorded_time", "comment"}.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            batch_size = int(request.query_params.get('batch_size', 500))
+        except ValueError:
+            batch_size = 0
+        if batch_size < 1:
+            return Response({"error": "batch_size must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            events, errors = parse_events(request.body.decode('utf-8'))
+        except ValidationError as e:
+            return Response({"error": str(e.detail[0])}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({"error": "The body must be UTF-8."}, status=status.HTTP_400_BAD_REQUEST)
+
+        created, rejected = ingest_worklogs(events, batch_size=batch_size)
+        errors = sorted(
+            [{'index': index, 'error': error} for index, error in errors] + rejected,
+            key=lambda error: error['index']
+        )
+
+        return Response({
+            'received': len(events),
+            'created': created,
+            'errors': errors
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import os
+
+import aiohttp
+
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', 10))
+API_MAX_CONCURRENCY = int(os.getenv('API_MAX_CONCURRENCY', 20))
+
+
+class ApiResponse:
+    """The parts of a backend response the handlers use, read before the connection is released."""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ApiClient:
+    """
+    Shared aiohttp session for calls to the Django backend.
+
+    Connections are kept alive between calls and at most `max_concurrency` requests
+    are in flight at once, so a burst of chats cannot open unbounded sockets.
+    """
+
+    def __init__(self, base_url, timeout=API_TIMEOUT, max_concurrency=API_MAX_CONCURRENCY):
+        self.base_url = base_url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+
+    def _get_session(self):
+        # Created lazily so the session is bound to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def request(self, method, path, timeout=None, **kwargs):
+        session = self._get_session()
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+
+        async with self._semaphore:
+            async with session.request(method, f"{self.base_url}{path}", **kwargs) as response:
+                return ApiResponse(response.status, await response.text())
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, json=None, **kwargs):
+        return await self.request('POST', path, json=json, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -1,13 +1,17 @@
 import json
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 import os
-import requests
 from aiogram import Bot, Dispatcher, executor, types
 from aiogram.types import (InlineKeyboardButton, InlineKeyboardMarkup,
                            ReplyKeyboardMarkup)
 from aiogram.dispatcher import FSMContext
 from aiogram.contrib.fsm_storage.memory import MemoryStorage 
+from aiogram.bot.api import TelegramAPIServer
+from aiogram.utils.callback_data import CallbackData
+from aiogram.utils.exceptions import MessageNotModified
+from aiohttp import web
 
 from persiantools.jdatetime import JalaliDate
 from input_states import (LeaveInputState, WorkLogInputState,
@@ -15,7 +19,10 @@ from input_states import (LeaveInputState, WorkLogInputState,
 from reply_keyboards import (yes_no_reply_keyboard, today_worklog_reply_keyboard,
                              worklog_status_keyboard_reply)
 
-from helper_utils import format_leave_response, format_worklog_response
+from api_client import ApiClient
+from middlewares import ConcurrencyLimitMiddleware
+from sqlite_storage import SQLiteStorage
+from helper_utils import format_leave_pages, format_worklog_pages
 
 load_dotenv()
 
@@ -23,10 +30,41 @@ BASE_API_URL = os.getenv('BASE_API_URL')
 
 TELEGRAM_API_TOKEN = os.getenv('TELEGRAM_API_TOKEN')
 
-
-storage = MemoryStorage()
-bot = Bot(token=TELEGRAM_API_TOKEN, parse_mode='HTML')
+# "polling" (default, for local development) or "webhook"
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Public base URL Telegram posts to, e.g. https://bot.example.com; the webhook is
+# registered on startup only when it is set
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', 8080))
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', 50))
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', 30))
+# Alternative Bot API server, e.g. a local Bot API server or fake_telegram.py
+TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER')
+# Seconds a fetched monthly report stays in the chat's storage bucket for paging
+REPORT_CACHE_TTL = int(os.getenv('REPORT_CACHE_TTL', 300))
+
+
+api_client = ApiClient(BASE_API_URL)
+
+# SQLite keeps half-finished conversations across restarts and shares them between replicas
+if os.getenv('FSM_STORAGE', 'sqlite') == 'memory':
+    storage = MemoryStorage()
+else:
+    storage = SQLiteStorage(
+        os.getenv('FSM_STORAGE_PATH', 'fsm_storage.sqlite3'),
+        ttl=int(os.getenv('FSM_STATE_TTL', 24 * 3600)),
+    )
+bot = Bot(
+    token=TELEGRAM_API_TOKEN,
+    parse_mode='HTML',
+    **({'server': TelegramAPIServer.from_base(TELEGRAM_API_SERVER)} if TELEGRAM_API_SERVER else {})
+)
 dp = Dispatcher(bot, storage=storage)
+concurrency_limit = ConcurrencyLimitMiddleware(MAX_CONCURRENT_UPDATES)
+dp.middleware.setup(concurrency_limit)
 
 
 # Define the main menu inline keyboard
@@ -39,6 +77,66 @@ main_menu_keyboard.add(
     InlineKeyboardButton(text="Get Leave Days", callback_data="get_leaveday")
 )
 
+report_page_cb = CallbackData('report', 'kind', 'year', 'month', 'page')
+
+# Backend path and page renderer of each monthly report
+REPORTS = {
+    'worklog': ("/worklog/jalali/monthly/{telegram_id}/{year}/{month}/", format_worklog_pages),
+    'leave': ("/leave/jalali/monthly/{telegram_id}/{year}/{month}/", format_leave_pages),
+}
+
+
+async def fetch_report(chat_id, telegram_id, kind, year, month, refresh=False):
+    """
+    Month data of a report, kept in the chat's storage bucket for REPORT_CACHE_TTL seconds
+    so turning pages does not call the backend again. Returns (data, None) on success
+    and (None, response) when the backend answers with an error.
+    """
+    key = f"report:{kind}:{year}:{month}"
+    now = time.time()
+    bucket = await dp.storage.get_bucket(chat=chat_id, user=telegram_id)
+    cached = bucket.get(key)
+    if not refresh and cached and cached['fetched_at'] > now - REPORT_CACHE_TTL:
+        return cached['data'], None
+
+    response = await api_client.get(REPORTS[kind][0].format(telegram_id=telegram_id, year=year, month=month))
+    if response.status_code != 200:
+        return None, response
+    data = response.json()
+
+    # Drop expired reports so the bucket does not grow with every month looked at
+    bucket = {
+        name: value for name, value in bucket.items()
+        if not name.startswith('report:') or value['fetched_at'] > now - REPORT_CACHE_TTL
+    }
+    bucket[key] = {'fetched_at': now, 'data': data}
+    await dp.storage.set_bucket(chat=chat_id, user=telegram_id, bucket=bucket)
+    return data, None
+
+
+def report_page_keyboard(kind, year, month, page, pages):
+    if pages < 2:
+        return None
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(
+            text="« Prev", callback_data=report_page_cb.new(kind=kind, year=year, month=month, page=page - 1)
+        ))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton(
+            text="Next »", callback_data=report_page_cb.new(kind=kind, year=year, month=month, page=page + 1)
+        ))
+    return InlineKeyboardMarkup().row(*buttons)
+
+
+async def send_report(message, telegram_id, kind, year, month):
+    """Fetch a fresh monthly report and send its first page; returns the error response, if any."""
+    data, error = await fetch_report(message.chat.id, telegram_id, kind, year, month, refresh=True)
+    if error is not None:
+        return error
+    pages = REPORTS[kind][1](data)
+    await message.answer(pages[0], reply_markup=report_page_keyboard(kind, year, month, 0, len(pages)))
+
 
 @dp.message_handler(commands=['start'])
 async def start(message: types.Message):
@@ -109,10 +207,9 @@ async def call_sign_up_api(message: types.Message, state: FSMContext):
         "password2": password2
     }
 
-    response = requests.post(
-        f"{BASE_API_URL}/user-signup/",
-        headers={'Content-Type': 'application/json'},
-        json=api_data, timeout=10
+    response = await api_client.post(
+        "/user-signup/",
+        json=api_data
     )
 
     if response.status_code == 201:
@@ -193,11 +290,9 @@ async def handle_worklog_status(message: types.Message, state: FSMContext):
         "recorded_time": recorded_time
     }
 
-    response = requests.post(
-        f"{BASE_API_URL}/worklog/add/{telegram_id}/",
-        headers={'Content-Type': 'application/json'},
-        json=data,
-        timeout=10
+    response = await api_client.post(
+        f"/worklog/add/{telegram_id}/",
+        json=data
     )
 
     if response.status_code == 201:
@@ -214,12 +309,9 @@ async def get_worklog_jalali(message: types.Message, state: FSMContext):
     try:
         jalali_year, jalali_month = map(int, message.text.split())
         
-        response = requests.get(f"{BASE_API_URL}/worklog/jalali/monthly/{telegram_id}/{jalali_year}/{jalali_month}/")
-        if response.status_code == 200:
-            worklog_data = response.json()
-            await message.answer(format_worklog_response(worklog_data))
-        else:
-            await message.answer(f"Unable to fetch work logs at the moment. {response.text}")
+        error = await send_report(message, telegram_id, 'worklog', jalali_year, jalali_month)
+        if error is not None:
+            await message.answer(f"Unable to fetch work logs at the moment. {error.text}")
     except ValueError:
         await message.answer("Invalid format. Please enter the Jalali year and month as two numbers (e.g., 1402 7).")
     finally:
@@ -234,12 +326,9 @@ async def get_leave_jalali(message: types.Message, state: FSMContext):
     try:
         jalali_year, jalali_month = map(int, message.text.split())
         
-        response = requests.get(f"{BASE_API_URL}/leave/jalali/monthly/{telegram_id}/{jalali_year}/{jalali_month}/")
-        if response.status_code == 200:
-            leave_data = response.json()
-            await message.answer(format_leave_response(leave_data))
-        else:
-            await message.answer(f"Unable to fetch leave records at the moment. {response.text}", reply_markup=main_menu_keyboard)
+        error = await send_report(message, telegram_id, 'leave', jalali_year, jalali_month)
+        if error is not None:
+            await message.answer(f"Unable to fetch leave records at the moment. {error.text}", reply_markup=main_menu_keyboard)
     except ValueError:
         await message.answer("Invalid format. Please enter the Jalali year and month as two numbers (e.g., 1402 7).")
     finally:
@@ -247,6 +336,26 @@ async def get_leave_jalali(message: types.Message, state: FSMContext):
         await message.answer("What would you like to do next?", reply_markup=main_menu_keyboard)
 
 
+@dp.callback_query_handler(report_page_cb.filter(kind=list(REPORTS)), state='*')
+async def turn_report_page(call: types.CallbackQuery, callback_data: dict):
+    kind = callback_data['kind']
+    year, month, page = int(callback_data['year']), int(callback_data['month']), int(callback_data['page'])
+
+    data, error = await fetch_report(call.message.chat.id, call.from_user.id, kind, year, month)
+    if error is not None:
+        await call.answer("Unable to fetch the report at the moment.", show_alert=True)
+        return
+
+    pages = REPORTS[kind][1](data)
+    # The month may have fewer pages after a refetch
+    page = min(page, len(pages) - 1)
+    try:
+        await call.message.edit_text(pages[page], reply_markup=report_page_keyboard(kind, year, month, page, len(pages)))
+    except MessageNotModified:
+        pass
+    await call.answer()
+
+
 @dp.message_handler(lambda message: message.text in ["Yes", "No"])
 async def handle_leave_day(message: types.Message, state: FSMContext):
     if message.text == "Yes":
@@ -258,10 +367,9 @@ async def handle_leave_day(message: types.Message, state: FSMContext):
             "reason": "User-initiated leave day",
         }
 
-        response = requests.post(
-            f"{BASE_API_URL}/leave/add/{telegram_id}/",
-            headers={'Content-Type': 'application/json'},
-            json=data, timeout=10
+        response = await api_client.post(
+            f"/leave/add/{telegram_id}/",
+            json=data
         )
 
         if response.status_code == 201:
@@ -304,10 +412,9 @@ async def process_end_time(message: types.Message, state: FSMContext):
         "end_time": end_time
     }
 
-    response = requests.post(
-        f"{BASE_API_URL}/leave/add/{telegram_id}/",
-        headers={'Content-Type': 'application/json'},
-        json=api_data, timeout=10
+    response = await api_client.post(
+        f"/leave/add/{telegram_id}/",
+        json=api_data
     )
 
     if response.status_code == 201:
@@ -319,5 +426,47 @@ async def process_end_time(message: types.Message, state: FSMContext):
 
     await state.finish() 
 
-executor.start_polling(dp)
+async def on_startup_webhook(dispatcher):
+    if WEBHOOK_HOST:
+        await dispatcher.bot.set_webhook(
+            WEBHOOK_HOST + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            max_connections=MAX_CONCURRENT_UPDATES
+        )
+
+
+async def on_shutdown(dispatcher):
+    # Let the updates in progress finish their backend calls before closing the client
+    await concurrency_limit.wait_idle(SHUTDOWN_TIMEOUT)
+    await api_client.close()
+
+
+@web.middleware
+async def check_webhook_secret(request, handler):
+    # Telegram echoes the secret_token given to setWebhook in this header
+    if WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+        raise web.HTTPUnauthorized()
+    return await handler(request)
+
+
+def main():
+    if BOT_MODE == 'webhook':
+        webhook_executor = executor.set_webhook(
+            dispatcher=dp,
+            webhook_path=WEBHOOK_PATH,
+            on_startup=on_startup_webhook,
+            on_shutdown=on_shutdown,
+            web_app=web.Application(middlewares=[check_webhook_secret]),
+        )
+        # aiohttp stops accepting requests on SIGTERM/SIGINT, then runs on_shutdown. Stay on
+        # the loop set_webhook started up on, which owns the bot's HTTP session.
+        webhook_executor.run_app(
+            host=WEBAPP_HOST, port=WEBAPP_PORT, shutdown_timeout=SHUTDOWN_TIMEOUT, loop=webhook_executor.loop
+        )
+    else:
+        executor.start_polling(dp, on_shutdown=on_shutdown)
+
+
+if __name__ == '__main__':
+    main()
 
@@ -0,0 +1,147 @@
+"""
+Local stand-in for Telegram, to exercise the bot's webhook mode without a public URL.
+
+`api` serves a fake Bot API (every method succeeds); `send` posts fake updates to the
+webhook concurrently and reports the webhook latency and the Bot API calls they caused:
+
+    python fake_telegram.py api
+    TELEGRAM_API_SERVER=http://127.0.0.1:8081 BOT_MODE=webhook python bot_manager.py
+    python fake_telegram.py send --updates 500 --concurrency 50
+
+TELEGRAM_API_TOKEN only needs to look like a token (e.g. 123456:fake) in this setup.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+from aiohttp import ClientSession, web
+
+FAKE_BOT = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+
+
+class FakeBotApi:
+    """Answers every Bot API method; send*/edit* calls get back a message."""
+
+    def __init__(self):
+        self.calls = 0
+        self._message_ids = itertools.count(1)
+
+    async def handle(self, request):
+        self.calls += 1
+        method = request.match_info['method']
+        data = dict(await request.post()) if request.body_exists else {}
+
+        if method == 'getMe':
+            result = FAKE_BOT
+        elif method.startswith(('send', 'edit')):
+            chat_id = int(data.get('chat_id', 0))
+            result = {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': FAKE_BOT,
+                'text': data.get('text', ''),
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def stats(self, request):
+        return web.json_response({'calls': self.calls})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+
+def make_update(update_id, chat_id, text):
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': f'User {chat_id}'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+async def api_calls(session, api_url):
+    async with session.get(f'{api_url}/stats') as response:
+        return (await response.json())['calls']
+
+
+async def send_updates(url, api_url, updates, concurrency, chats, text, secret):
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    latencies, failures = [], 0
+
+    async def send(session, update_id):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            update = make_update(update_id, 1000 + update_id % chats, text)
+            async with session.post(url, json=update, headers=headers) as response:
+                await response.read()
+                if response.status != 200:
+                    failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    async with ClientSession() as session:
+        calls_before = await api_calls(session, api_url)
+        started = time.perf_counter()
+        await asyncio.gather(*(send(session, update_id) for update_id in range(1, updates + 1)))
+        elapsed = time.perf_counter() - started
+        # Updates answered late keep calling the API, so this is a lower bound
+        calls = await api_calls(session, api_url) - calls_before
+
+    latencies.sort()
+    print(f"{updates} updates in {elapsed:.2f}s ({updates / elapsed:.0f}/s), {failures} failed")
+    print(f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms   "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms   "
+          f"{calls} Bot API calls")
+
+
+async def serve_api(host, port):
+    runner = web.AppRunner(FakeBotApi().app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Fake Bot API on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    api = commands.add_parser('api', help="Serve the fake Bot API.")
+    api.add_argument('--host', default='127.0.0.1')
+    api.add_argument('--port', type=int, default=8081)
+
+    send = commands.add_parser('send', help="Post fake updates to the bot's webhook.")
+    send.add_argument('--webhook-url', default='http://127.0.0.1:8080/telegram/webhook')
+    send.add_argument('--api-url', default='http://127.0.0.1:8081', help="The fake Bot API, for the call count.")
+    send.add_argument('--secret', default='', help="WEBHOOK_SECRET of the bot, if set.")
+    send.add_argument('--updates', type=int, default=100)
+    send.add_argument('--concurrency', type=int, default=20)
+    send.add_argument('--chats', type=int, default=50, help="Number of distinct fake users.")
+    send.add_argument('--text', default='/start', help="Message text of every update.")
+
+    options = parser.parse_args()
+    try:
+        if options.command == 'api':
+            asyncio.run(serve_api(options.host, options.port))
+        else:
+            asyncio.run(send_updates(
+                options.webhook_url, options.api_url, options.updates, options.concurrency,
+                options.chats, options.text, options.secret
+            ))
+    except KeyboardInterrupt:
+        pass
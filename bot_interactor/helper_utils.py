@@ -1,24 +1,55 @@
+from aiogram.utils.markdown import quote_html
 
-def format_leave_response(leave_data):
-    leave_records = leave_data['leave_records']
-    total_days = leave_data['total_days']
-    total_hours = leave_data['total_hours']
-    total_minutes = leave_data['total_minutes']
-    
-    message = "Your Leave Days for the Month:\n"
-    for leave in leave_records:
-        message += f"- {leave['leave_date']} (Reason: {leave['reason']})\n"
-    
-    message += f"\nTotal Days of Leave: {total_days} days\nTotal Hours of Leave: {total_hours} hours and {total_minutes} minutes"
-    return message
-
-def format_worklog_response(worklog_data):
-    total_hours = worklog_data['total_hours']
-    work_logs = worklog_data['work_logs']
-    
-    message = "Your Work Logs for the Month:\n"
-    for log in work_logs:
-        message += f"- {log['status']} at {log['recorded_time']}\n"
-    
-    message += f"\nTotal Hours Worked: {total_hours['days']} days, {total_hours['hours']} hours, {total_hours['minutes']} minutes"
-    return message
\ No newline at end of file
+# Telegram rejects messages longer than this
+MESSAGE_LIMIT = 4096
+PAGE_LINES = 25
+# Room left in each page for the " (page 12/34)" marker
+PAGE_MARKER_RESERVE = 24
+
+LEAVE_HEADER = "Your Leave Days for the Month:"
+LEAVE_LINE = "- {leave_date} (Reason: {reason})".format
+LEAVE_FOOTER = "Total Days of Leave: {} days\nTotal Hours of Leave: {} hours and {} minutes".format
+
+WORKLOG_HEADER = "Your Work Logs for the Month:"
+WORKLOG_LINE = "- {status} at {recorded_time}".format
+WORKLOG_FOOTER = "Total Hours Worked: {days} days, {hours} hours, {minutes} minutes".format
+
+
+def paginate(header, lines, footer, limit=MESSAGE_LIMIT, max_lines=PAGE_LINES):
+    """
+    Split `lines` into messages of at most `max_lines` lines that fit in `limit` characters
+    together with the header and footer, which repeat on every page.
+    """
+    budget = limit - len(header) - len(footer) - PAGE_MARKER_RESERVE
+    chunks, chunk, size = [], [], 0
+    for line in lines:
+        line = line[:budget - 1]
+        if chunk and (len(chunk) == max_lines or size + len(line) + 1 > budget):
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk or not chunks:
+        chunks.append(chunk)
+
+    if len(chunks) == 1:
+        return ['\n'.join([header, *chunks[0], '', footer])]
+    return [
+        '\n'.join([f"{header} (page {number}/{len(chunks)})", *chunk, '', footer])
+        for number, chunk in enumerate(chunks, start=1)
+    ]
+
+
+def format_leave_pages(leave_data):
+    lines = [
+        LEAVE_LINE(leave_date=leave['leave_date'], reason=quote_html(str(leave['reason'])))
+        for leave in leave_data['leave_records']
+    ]
+    footer = LEAVE_FOOTER(leave_data['total_days'], leave_data['total_hours'], leave_data['total_minutes'])
+    return paginate(LEAVE_HEADER, lines, footer)
+
+
+def format_worklog_pages(worklog_data):
+    lines = [WORKLOG_LINE(status=log['status'], recorded_time=log['recorded_time'])
+             for log in worklog_data['work_logs']]
+    return paginate(WORKLOG_HEADER, lines, WORKLOG_FOOTER(**worklog_data['total_hours']))
@@ -0,0 +1,43 @@
+import asyncio
+
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """
+    Process at most `limit` updates at once.
+
+    Webhook requests (and fast polling) hand every update to its own task; without a cap a
+    burst of chats would fire an unbounded number of backend calls. Updates over the limit
+    wait for a free slot instead of being dropped.
+    """
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def on_pre_process_update(self, update, data):
+        await self._semaphore.acquire()
+        self._in_flight += 1
+        self._idle.clear()
+        data['_concurrency_slot'] = True
+
+    async def on_post_process_update(self, update, results, data):
+        # post_process runs in a finally block, so a failing handler still frees its slot
+        if data.pop('_concurrency_slot', False):
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._idle.set()
+            self._semaphore.release()
+
+    async def wait_idle(self, timeout):
+        """Wait for the updates in progress to finish; used for a graceful shutdown."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
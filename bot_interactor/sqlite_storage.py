@@ -0,0 +1,182 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import typing
+
+from aiogram.dispatcher.storage import BaseStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    chat TEXT NOT NULL,
+    user TEXT NOT NULL,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    bucket TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (chat, user)
+);
+CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at);
+"""
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage in a SQLite file, shared by every bot process that points at it.
+
+    Conversations survive restarts, and several replicas can serve the same chats: each
+    read-modify-write runs in a BEGIN IMMEDIATE transaction, and WAL mode keeps readers
+    from blocking the writer. Rows untouched for `ttl` seconds are abandoned conversations;
+    they read as empty and are purged every `purge_interval` seconds.
+    Data and buckets are stored as JSON, like aiogram's Redis storage.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, purge_interval=600, busy_timeout=10):
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._connection = sqlite3.connect(
+            path, timeout=busy_timeout, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+
+    async def _run(self, function, *args):
+        # sqlite3 blocks, so keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def _address(self, chat, user):
+        return tuple(map(str, self.check_address(chat=chat, user=user)))
+
+    def _expired_before(self):
+        return time.time() - self.ttl if self.ttl else float('-inf')
+
+    def _read(self, chat, user):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT state, data, bucket FROM fsm WHERE chat = ? AND user = ? AND updated_at >= ?',
+                (chat, user, self._expired_before())
+            ).fetchone()
+        if row is None:
+            return None, {}, {}
+        return row[0], json.loads(row[1]), json.loads(row[2])
+
+    def _write(self, chat, user, change):
+        """Apply change(state, data, bucket) -> (state, data, bucket) atomically across processes."""
+        with self._lock:
+            connection = self._connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute(
+                    'SELECT state, data, bucket FROM fsm WHERE chat = ? AND user = ? AND updated_at >= ?',
+                    (chat, user, self._expired_before())
+                ).fetchone()
+                current = (row[0], json.loads(row[1]), json.loads(row[2])) if row else (None, {}, {})
+                state, data, bucket = change(*current)
+
+                if state is None and not data and not bucket:
+                    connection.execute('DELETE FROM fsm WHERE chat = ? AND user = ?', (chat, user))
+                else:
+                    connection.execute(
+                        'INSERT INTO fsm (chat, user, state, data, bucket, updated_at) VALUES (?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT (chat, user) DO UPDATE SET state = excluded.state, data = excluded.data, '
+                        'bucket = excluded.bucket, updated_at = excluded.updated_at',
+                        (chat, user, state, json.dumps(data), json.dumps(bucket), time.time())
+                    )
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            self._purge_expired()
+
+    def _purge_expired(self):
+        now = time.time()
+        if not self.ttl or now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self._connection.execute('DELETE FROM fsm WHERE updated_at < ?', (self._expired_before(),))
+
+    async def close(self):
+        with self._lock:
+            self._connection.close()
+
+    async def wait_closed(self):
+        pass
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        state, _, _ = await self._run(self._read, *self._address(chat, user))
+        return state if state is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        _, data, _ = await self._run(self._read, *self._address(chat, user))
+        return data or dict(default or {})
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        state = self.resolve_state(state)
+        await self._run(self._write, *self._address(chat, user), lambda _, data, bucket: (state, data, bucket))
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        data = dict(data or {})
+        await self._run(self._write, *self._address(chat, user), lambda state, _, bucket: (state, data, bucket))
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        changes = {**(data or {}), **kwargs}
+        await self._run(
+            self._write, *self._address(chat, user),
+            lambda state, current, bucket: (state, {**current, **changes}, bucket)
+        )
+
+    async def reset_state(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        await self._run(
+            self._write, *self._address(chat, user),
+            lambda _, data, bucket: (None, {} if with_data else data, bucket)
+        )
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        _, _, bucket = await self._run(self._read, *self._address(chat, user))
+        return bucket or dict(default or {})
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        bucket = dict(bucket or {})
+        await self._run(self._write, *self._address(chat, user), lambda state, data, _: (state, data, bucket))
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        changes = {**(bucket or {}), **kwargs}
+        await self._run(
+            self._write, *self._address(chat, user),
+            lambda state, data, current: (state, data, {**current, **changes})
+        )